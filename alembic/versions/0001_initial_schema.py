@@ -0,0 +1,72 @@
+"""initial schema
+
+The tables previously created by ``Base.metadata.create_all`` on startup. Tables that
+already exist (databases created that way, which have no ``alembic_version`` yet) are
+left as they are, so ``alembic upgrade head`` adopts them.
+
+Revision ID: 0001
+Revises:
+Create Date: 2023-01-20 10:00:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def existing_tables() -> set:
+    """Tables already in the database; none when only generating SQL (``--sql``)."""
+    if context.is_offline_mode():
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    existing = existing_tables()
+    op.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+    if "polls" not in existing:
+        op.create_table(
+            "polls",
+            sa.Column("id", sa.String(128), primary_key=True),
+            sa.Column("question", sa.String(), nullable=False),
+        )
+    if "options" not in existing:
+        op.create_table(
+            "options",
+            sa.Column("id", sa.String(128), primary_key=True),
+            sa.Column("poll_id", sa.String(128), sa.ForeignKey("polls.id"), nullable=False),
+            sa.Column("option", sa.String(), nullable=False),
+        )
+        op.create_index("ix_options_poll_id", "options", ["poll_id"])
+    if "votes" not in existing:
+        op.create_table(
+            "votes",
+            sa.Column("id", sa.String(128), primary_key=True),
+            sa.Column("poll_id", sa.String(128), nullable=False),
+            sa.Column("option_id", sa.String(128), nullable=False),
+            sa.Column("user_id", sa.String(128), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.UniqueConstraint("poll_id", "user_id", name="unique_vote"),
+        )
+        op.create_index("ix_votes_poll_id", "votes", ["poll_id"])
+        op.create_index("ix_votes_option_id", "votes", ["option_id"])
+        op.create_index("ix_votes_user_id", "votes", ["user_id"])
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.String(128), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("users")
+    op.drop_table("votes")
+    op.drop_table("options")
+    op.drop_table("polls")
@@ -0,0 +1,40 @@
+"""poll_option_counts
+
+Denormalized vote totals per poll option, kept in step with ``votes`` by the vote
+insert and backfilled here from the existing votes. A table left by the old
+``create_all`` startup is kept and recounted, as it may have missed earlier votes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2023-01-20 11:00:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("poll_option_counts"):
+        op.execute("DELETE FROM poll_option_counts")
+    else:
+        op.create_table(
+            "poll_option_counts",
+            sa.Column("poll_id", sa.String(128), primary_key=True),
+            sa.Column("option_id", sa.String(128), primary_key=True),
+            sa.Column("total", sa.BigInteger(), nullable=False, server_default="0"),
+        )
+    op.execute(
+        "INSERT INTO poll_option_counts (poll_id, option_id, total) "
+        "SELECT poll_id, option_id, count(*) FROM votes GROUP BY poll_id, option_id"
+    )
+
+
+def downgrade():
+    op.drop_table("poll_option_counts")
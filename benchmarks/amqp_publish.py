@@ -0,0 +1,68 @@
+"""Publish throughput of ``PikaClient`` against the in-process broker stand-in.
+
+Compares the previous per-message path (new robust connection per publish, closed after
+one message) with the pooled ``publish_batch`` API. ``--latency`` is the simulated round
+trip to the broker.
+
+Usage: python -m benchmarks.amqp_publish [--messages 5000] [--latency 0.0005]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aio_pika
+
+from project.core import PikaClient
+from tests.broker import InMemoryBroker
+
+MESSAGE = {
+    "broadcast": False,
+    "recipients": ["8fd67538-521c-403b-97b4-542ec7d3fb7f"],
+    "message": {"poll_id": "p", "question": "q", "votes": [{"option": "a", "total": 1}]},
+}
+
+
+async def per_message(broker: InMemoryBroker, messages: int) -> float:
+    """The previous code path: init_connection() then ``async with connection`` per message."""
+    start = time.perf_counter()
+    for _ in range(messages):
+        connection = await broker.connect()
+        async with connection:
+            channel = await connection.channel()
+            await channel.default_exchange.publish(
+                aio_pika.Message(body=json.dumps(MESSAGE).encode()), routing_key="bench"
+            )
+    return messages / (time.perf_counter() - start)
+
+
+async def run(messages: int, batch_size: int, latency: float):
+    broker = InMemoryBroker(latency=latency)
+    await (await (await broker.connect()).channel()).declare_queue("bench")
+
+    baseline = await per_message(broker, messages)
+    print(f"per-message : {baseline:,.0f} msg/sec ({broker.connections_opened} connections opened)")
+
+    opened = broker.connections_opened
+    client = PikaClient(lambda message: None, connection_factory=broker.connect)
+    start = time.perf_counter()
+    for offset in range(0, messages, batch_size):
+        await client.publish_batch([MESSAGE] * min(batch_size, messages - offset), "bench")
+    batched = messages / (time.perf_counter() - start)
+    print(f"batched     : {batched:,.0f} msg/sec ({broker.connections_opened - opened} connections opened, "
+          f"{batched / baseline:.0f}x)")
+    print(f"stats       : {client.stats()}")
+    await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0005)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.batch_size, args.latency))
+
+
+if __name__ == "__main__":
+    main()
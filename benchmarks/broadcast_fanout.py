@@ -0,0 +1,67 @@
+"""Fan-out latency of ``WebSocketManager.broadcast_all_users`` against fake sockets.
+
+Usage: python -m benchmarks.broadcast_fanout [--users 10000] [--rounds 5]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.support import percentile
+from project.core import WebSocketManager
+from tests.fakes import FakeWebSocket
+
+PAYLOAD = {
+    "poll_id": "5b0a4c0e-5c4e-4a4f-9d8e-6f5a0c1d2e3f",
+    "question": "Which option do you prefer?",
+    "votes": [{"option": f"Option {i}", "total": i * 137} for i in range(12)],
+}
+
+
+async def sequential_broadcast(wm: WebSocketManager, payload):
+    """The previous implementation: one awaited send and one encode per user."""
+    for connections in wm.users.values():
+        for connection in connections:
+            await connection.websocket.send_json(jsonable_encoder(payload))
+
+
+async def run(users: int, rounds: int, latency: float, jitter: float, slow: int):
+    wm = WebSocketManager(send_timeout=0.5)
+    for i in range(users):
+        stall = i < slow
+        wm.add_user(f"user-{i}", f"User {i}", FakeWebSocket(latency=latency, jitter=jitter, stall=stall))
+
+    concurrent, sequential = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await wm.broadcast_all_users(PAYLOAD)
+        await wm.flush()
+        concurrent.append(time.perf_counter() - start)
+
+    print(f"users={users} slow={slow} latency={latency * 1000:.1f}ms jitter={jitter * 1000:.1f}ms")
+    print(f"  concurrent : p50={percentile(concurrent, 50) * 1000:.1f}ms "
+          f"max={max(concurrent) * 1000:.1f}ms evicted={users - len(wm)}")
+    print(f"  queues     : {wm.stats()}")
+
+    if not slow:
+        for _ in range(min(rounds, 2)):
+            start = time.perf_counter()
+            await sequential_broadcast(wm, PAYLOAD)
+            sequential.append(time.perf_counter() - start)
+        print(f"  sequential : p50={percentile(sequential, 50) * 1000:.1f}ms max={max(sequential) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="per-send latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0005)
+    parser.add_argument("--slow", type=int, default=0, help="number of stalled clients")
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.rounds, args.latency, args.jitter, args.slow))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Rows/sec of the COPY-based bulk create endpoints versus one INSERT per row.
+
+Streams a generated NDJSON body of ``--users`` users to ``POST /poll/users/bulk`` and of
+``--polls`` polls with ``--options`` options each to ``POST /poll/bulk``, in 64KiB
+request chunks through the ASGI app, and times a ``--baseline`` sample of users inserted
+one statement per row in a single transaction (the single-row model constructors'
+path). Runs against ``DATABASE_URL`` and deletes what it created.
+
+Usage: python -m benchmarks.bulk_load [--users 200000] [--polls 10000] [--options 4] [--baseline 5000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Iterator, List
+
+from fastapi import FastAPI
+from sqlalchemy import insert, text
+
+from project.config import settings
+from project.database import engine
+from project.polls import polls_router
+from project.polls.models import User
+
+BODY_CHUNK = 64 * 1024
+
+# Arrays rather than IN lists: hundreds of thousands of ids exceed the bind parameter limit
+CLEANUP = [
+    text("DELETE FROM options WHERE poll_id = ANY(CAST(:poll_ids AS varchar[]))"),
+    text("DELETE FROM polls WHERE id = ANY(CAST(:poll_ids AS varchar[]))"),
+    text("DELETE FROM users WHERE id = ANY(CAST(:user_ids AS varchar[]))"),
+]
+
+
+def ndjson_body(records: Iterator[dict]) -> Iterator[bytes]:
+    buffer = bytearray()
+    for record in records:
+        buffer += json.dumps(record).encode() + b"\n"
+        if len(buffer) >= BODY_CHUNK:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def upload(app, path: str, chunks: Iterator[bytes]) -> dict:
+    """POST a streamed body through the ASGI app and return the decoded JSON response."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/x-ndjson")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    chunks = iter(chunks)
+    following = next(chunks, b"")
+    response = {"status": 0, "body": b""}
+
+    async def receive():
+        nonlocal following
+        body, following = following, next(chunks, None)
+        return {"type": "http.request", "body": body, "more_body": following is not None}
+
+    async def send(message: dict):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    if response["status"] != 201:
+        raise RuntimeError(f"{path} returned {response['status']}: {response['body'][:500]!r}")
+    return json.loads(response["body"])
+
+
+async def per_row(user_ids: List[str], tag: str) -> float:
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        for i, user_id in enumerate(user_ids):
+            await conn.execute(insert(User), {"id": user_id, "name": f"{tag}-baseline-{i}"})
+    return len(user_ids) / (time.perf_counter() - start)
+
+
+async def run(args):
+    settings.BULK_CHUNK_SIZE = args.chunk_size
+    app = FastAPI()
+    app.include_router(polls_router)
+    tag = f"bulk-{uuid.uuid4().hex[:8]}"
+    baseline_ids = [str(uuid.uuid4()) for _ in range(args.baseline)]
+    user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+    poll_ids = [str(uuid.uuid4()) for _ in range(args.polls)]
+    try:
+        baseline = await per_row(baseline_ids, tag)
+        print(f"per-row INSERT : {baseline:,.0f} rows/s ({args.baseline:,} users)")
+
+        users = await upload(app, "/poll/users/bulk", ndjson_body(
+            {"id": user_id, "name": f"{tag}-{i}"} for i, user_id in enumerate(user_ids)
+        ))
+        print(f"COPY users     : {users['rows_per_sec']:,} rows/s ({users['rows']:,} rows, "
+              f"{users['chunks']} chunks, {users['seconds']:.2f}s, {users['rows_per_sec'] / baseline:.1f}x)")
+
+        polls = await upload(app, "/poll/bulk", ndjson_body(
+            {"id": poll_id, "question": f"{tag} question {i}", "options": [f"option {j}" for j in range(args.options)]}
+            for i, poll_id in enumerate(poll_ids)
+        ))
+        print(f"COPY polls     : {polls['rows_per_sec']:,} rows/s ({polls['created']}, {polls['seconds']:.2f}s)")
+    finally:
+        async with engine.begin() as conn:
+            for statement in CLEANUP:
+                await conn.execute(statement, {"poll_ids": poll_ids, "user_ids": user_ids + baseline_ids})
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--polls", type=int, default=10_000)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--baseline", type=int, default=5_000, help="users inserted one row per statement")
+    parser.add_argument("--chunk-size", type=int, default=settings.BULK_CHUNK_SIZE)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
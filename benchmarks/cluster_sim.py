@@ -0,0 +1,90 @@
+"""Simulates several workers routing notifications through the in-process broker.
+
+Each simulated worker has its own ``WebSocketManager``, ``PikaClient`` and
+``ClusterRouter``, exactly as a separate uvicorn worker would; only the broker is shared.
+Users are spread over the workers and targeted notifications are routed from a random
+worker. Reports deliveries, broker messages used, and what fanning out to every worker
+would have cost.
+
+Usage: python -m benchmarks.cluster_sim [--workers 4] [--users 2000] [--notifications 2000]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from project.cluster import ClusterRouter
+from project.core import PikaClient, WebSocketManager
+from project.schemas import Notification
+from tests.broker import InMemoryBroker
+from tests.fakes import FakeWebSocket
+
+
+def make_worker(broker: InMemoryBroker, index: int):
+    wm = WebSocketManager()
+
+    def deliver_local(notifications):
+        for notification in notifications:
+            if notification.broadcast:
+                wm.send_to_all(notification.message)
+            else:
+                wm.deliver(notification.message, notification.recipients, notification.topic)
+
+    client = PikaClient(None, connection_factory=broker.connect)
+    router = ClusterRouter(client, wm, deliver_local, worker_id=f"worker-{index}", flush_interval=0.01)
+    return wm, client, router
+
+
+async def run(workers: int, users: int, notifications: int, recipients: int):
+    broker = InMemoryBroker()
+    nodes = [make_worker(broker, i) for i in range(workers)]
+    for _, _, router in nodes:
+        await router.start()
+
+    sockets = {}
+    for i in range(users):
+        wm = nodes[i % workers][0]
+        sockets[f"user-{i}"] = socket = FakeWebSocket()
+        connection = wm.add_user(f"user-{i}", f"User {i}", socket)
+        if i % 10 == 0:
+            wm.subscribe("poll:demo", connection)
+    await asyncio.sleep(0.1)
+
+    published = broker.published
+    expected = 0
+    start = time.perf_counter()
+    for n in range(notifications):
+        targets = random.sample(list(sockets), recipients)
+        expected += len(targets)
+        router = random.choice(nodes)[2]
+        await router.route([Notification(recipients=targets, message={"n": n})])
+    await router.route([Notification(topic="poll:demo", message={"n": "topic"})])
+    expected += len(range(0, users, 10))
+    await asyncio.sleep(0.2)
+    for wm, _, _ in nodes:
+        await wm.flush()
+    elapsed = time.perf_counter() - start
+
+    delivered = sum(len(socket.sent) for socket in sockets.values())
+    used = broker.published - published
+    print(f"workers={workers} users={users} notifications={notifications + 1} recipients={recipients}")
+    print(f"  delivered {delivered}/{expected} in {elapsed:.2f}s")
+    print(f"  broker messages: {used} (fan-out to every worker would need {(notifications + 1) * workers})")
+    for wm, client, router in nodes:
+        print(f"  {router.stats()}")
+        await router.stop()
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--recipients", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(run(args.workers, args.users, args.notifications, args.recipients))
+
+
+if __name__ == "__main__":
+    main()
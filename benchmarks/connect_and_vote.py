@@ -0,0 +1,101 @@
+"""Latency and allocations of the connect-and-vote path, before and after.
+
+"before" replays the previous handlers: on connect a new connection, transaction and
+``AsyncSession`` to select the user; on vote another connection, transaction and
+session, an ORM insert and a nested ``session.commit()``. "after" is the current path:
+the user comes from ``UserCache`` and the vote goes through ``VoteIngestor`` (one
+session-free transaction per batch). Runs against ``DATABASE_URL`` with an existing user
+and deletes the votes and counts it creates.
+
+Usage: python -m benchmarks.connect_and_vote [--voters 200]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.support import percentile
+from project.cache import UserCache
+from project.database import engine
+from project.polls.ingest import VoteIngestor
+from project.polls.models import PollOptionCount, User, Vote
+
+
+async def before(user_id: str, poll_id: str, voter: str):
+    sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)  # get_session built one per request
+    async with engine.connect() as conn:
+        async with conn.begin():
+            session = AsyncSession(conn)
+            (await session.execute(select(User).where(User.id == user_id))).scalars().first()
+    async with engine.connect() as conn:
+        async with conn.begin():
+            session = AsyncSession(conn)
+            session.add(Vote(id=str(uuid.uuid4()), poll_id=poll_id, option_id="bench-option", user_id=voter))
+            await session.commit()
+
+
+def after_path(user_cache: UserCache, ingestor: VoteIngestor):
+    async def after(user_id: str, poll_id: str, voter: str):
+        await user_cache.get(user_id)
+        await ingestor.submit(poll_id, "bench-option", voter)
+    return after
+
+
+async def measure(path, user_id: str, voters: int):
+    poll_id = f"bench-{uuid.uuid4()}"
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        await path(user_id, poll_id, f"voter-{i}")
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(voters)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    async with engine.begin() as conn:
+        await conn.execute(delete(Vote).where(Vote.poll_id == poll_id))
+        await conn.execute(delete(PollOptionCount).where(PollOptionCount.poll_id == poll_id))
+    return latencies, elapsed, peak, snapshot_blocks
+
+
+def report(name, voters, latencies, elapsed, peak, blocks):
+    print(f"  {name:<7} {voters / elapsed:8,.0f} votes/s  p50={percentile(latencies, 50) * 1000:6.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:6.1f}ms  peak={peak / voters / 1024:6.1f}KiB/vote "
+          f"live_blocks={blocks}")
+
+
+async def run(voters: int):
+    async with engine.connect() as conn:
+        user_id = (await conn.execute(text("SELECT id FROM users LIMIT 1"))).scalar()
+    if user_id is None:
+        raise SystemExit("needs at least one row in users")
+
+    print(f"voters={voters}")
+    report("before", voters, *await measure(before, user_id, voters))
+    ingestor = VoteIngestor(engine)
+    ingestor.start()
+    report("after", voters, *await measure(after_path(UserCache(engine), ingestor), user_id, voters))
+    await ingestor.stop()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voters", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.voters))
+
+
+if __name__ == "__main__":
+    main()
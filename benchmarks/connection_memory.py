@@ -0,0 +1,76 @@
+"""Bytes per registered connection in ``WebSocketManager``.
+
+Registers ``--sockets`` fake sockets (10k and 100k by default), a ``--per-user`` share of
+them as extra tabs of an already connected user, subscribes every user to one of
+``--topics`` poll topics, and reports traced bytes per socket: idle, with one frame
+queued on every socket (queues and writer tasks exist), and idle again after the queues
+drained.
+
+Usage: python -m benchmarks.connection_memory [--sockets 10000 100000] [--per-user 2] [--topics 100]
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from project.core import WebSocketManager, poll_topic
+
+
+class NullWebSocket:
+    __slots__ = ()
+
+    async def send_text(self, data: str):
+        pass
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def measure(sockets: int, per_user: int, topics: int) -> dict:
+    user_ids = [f"{i:08d}-0000-4000-8000-000000000000" for i in range(sockets // per_user + 1)]
+    websockets = [NullWebSocket() for _ in range(sockets)]
+    tracemalloc.start()
+    baseline = traced()
+    wm = WebSocketManager()
+    for i, websocket in enumerate(websockets):
+        user_id = user_ids[i // per_user]
+        connection = wm.add_user(user_id, f"User {i // per_user}", websocket)
+        wm.subscribe(poll_topic(str(i % topics)), connection)
+    idle = traced()
+    wm.send_to_all({"type": "voter_join", "data": "someone"})
+    busy = traced()
+    await wm.flush()
+    await asyncio.sleep(0)  # let the finished writer tasks run their done callbacks
+    drained = traced()
+    tracemalloc.stop()
+    return {
+        "idle": (idle - baseline) / sockets,
+        "queued": (busy - baseline) / sockets,
+        "drained": (drained - baseline) / sockets,
+        "users": len(wm.users),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--per-user", type=int, default=2, help="sockets per user")
+    parser.add_argument("--topics", type=int, default=100)
+    args = parser.parse_args()
+
+    for sockets in args.sockets:
+        result = asyncio.run(measure(sockets, args.per_user, args.topics))
+        print(f"sockets={sockets} users={result['users']}: {result['idle']:7.0f}B idle, "
+              f"{result['queued']:7.0f}B with a queued frame, {result['drained']:7.0f}B after draining")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Rows/sec and peak memory of the streaming vote export (``/poll/{id}/votes``).
+
+Creates a poll with ``--votes`` votes in ``DATABASE_URL`` (generated server-side with
+``generate_series``), then downloads the export in-process through the ASGI app and
+reports rows/sec, MB/s, the growth of peak RSS, and the worst event loop lag seen by a
+ticker running alongside, i.e. how long other requests could have been held up. The
+fixture is deleted afterwards.
+
+Usage: python -m benchmarks.export [--votes 1000000] [--format ndjson] [--page-size 50000]
+"""
+import argparse
+import asyncio
+import resource
+import time
+import uuid
+
+from fastapi import FastAPI
+from sqlalchemy import delete, text
+
+from project.config import settings
+from project.database import engine
+from project.polls import polls_router, queries
+from project.polls.models import Option, Poll, PollOptionCount, Vote
+
+INSERT_VOTES = text(
+    "INSERT INTO votes (id, poll_id, option_id, user_id, created_at) "
+    "SELECT md5(:poll_id || g), :poll_id, (CAST(:option_ids AS varchar[]))[1 + g % 4], "
+    "'export-' || lpad(g::text, 10, '0'), now() FROM generate_series(1, :votes) AS g"
+)
+
+
+async def create_poll(votes: int) -> str:
+    poll_id = str(uuid.uuid4())
+    option_ids = [str(uuid.uuid4()) for _ in range(4)]
+    async with engine.begin() as conn:
+        await conn.execute(Poll.__table__.insert(), {"id": poll_id, "question": "export benchmark"})
+        await conn.execute(Option.__table__.insert(), [{"id": option_id, "poll_id": poll_id, "option": f"option {i}"}
+                                                       for i, option_id in enumerate(option_ids)])
+        await conn.execute(INSERT_VOTES, {"poll_id": poll_id, "option_ids": option_ids, "votes": votes})
+        await conn.execute(queries.COUNTS_REBUILD_POLL, {"poll_id": poll_id})
+    return poll_id
+
+
+async def drop_poll(poll_id: str):
+    async with engine.begin() as conn:
+        await conn.execute(delete(Vote).where(Vote.poll_id == poll_id))
+        await conn.execute(delete(PollOptionCount).where(PollOptionCount.poll_id == poll_id))
+        await conn.execute(delete(Option).where(Option.poll_id == poll_id))
+        await conn.execute(delete(Poll).where(Poll.id == poll_id))
+
+
+async def download(app, path: str, query: str) -> tuple:
+    """GET through the ASGI app; returns (status, body bytes, body lines)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query.encode(), "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    status = 0
+    size = 0
+    lines = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict):
+        nonlocal status, size, lines
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            size += len(body)
+            lines += body.count(b"\n")
+
+    await app(scope, receive, send)
+    return status, size, lines
+
+
+async def ticker(interval: float, lags: list):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(args):
+    settings.EXPORT_PAGE_SIZE = args.page_size
+    settings.EXPORT_CHUNK_SIZE = args.chunk_size
+    app = FastAPI()
+    app.include_router(polls_router)
+
+    start = time.perf_counter()
+    poll_id = await create_poll(args.votes)
+    print(f"created {args.votes:,} votes in {time.perf_counter() - start:.1f}s")
+    try:
+        lags: list = []
+        lag_task = asyncio.get_event_loop().create_task(ticker(0.01, lags))
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        status, size, lines = await download(app, f"/poll/{poll_id}/votes", f"format={args.format}")
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        lag_task.cancel()
+    finally:
+        await drop_poll(poll_id)
+        await engine.dispose()
+
+    rows = lines - (1 if args.format == "csv" else 0)
+    if status != 200 or rows != args.votes:
+        raise RuntimeError(f"export returned status {status} with {rows} rows, expected {args.votes}")
+    print(f"{args.format} page={args.page_size} chunk={args.chunk_size}: {rows:,} rows in {elapsed:.2f}s")
+    print(f"  {rows / elapsed:,.0f} rows/s, {size / elapsed / 1e6:.1f}MB/s ({size / 1e6:.1f}MB)")
+    print(f"  peak RSS +{(rss_after - rss_before) / 1024:.1f}MiB, "
+          f"max event loop lag {max(lags, default=0.0) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votes", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--page-size", type=int, default=settings.EXPORT_PAGE_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""End-to-end load test of the voting WebSocket pipeline.
+
+Builds the app with ``create_app()``, runs its startup handlers against ``DATABASE_URL``
+with ``InMemoryBroker`` standing in for RabbitMQ, and drives ``--voters`` in-process
+WebSocket clients through ``/ws_vote/{id}``: each connects, then votes once on each of
+``--polls`` polls. Reports votes/s, the latency from sending a vote to its ack and to the
+first tally push for that poll, and memory per idle connection. Results are written as
+JSON (with the current commit) so runs can be compared between commits; the default
+``benchmarks/results/`` directory is ignored by git.
+
+Postgres is required: the vote and tally statements use ``unnest`` and ``ANY`` arrays,
+so SQLite cannot stand in. The users, polls and options it creates are deleted afterwards.
+
+Usage: python -m benchmarks.load_test [--voters 500] [--polls 5] [--options 4] [--output benchmarks/results/load_test.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import resource
+import subprocess
+import time
+import tracemalloc
+import uuid
+from typing import Dict, List
+
+from sqlalchemy import delete, insert
+
+from benchmarks.support import ASGIWebSocket, Lifespan, percentile
+from project import create_app
+from project.database import engine
+from project.polls.models import Option, Poll, PollOptionCount, User, Vote
+from tests.broker import InMemoryBroker
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def create_fixtures(voters: int, polls: int, options: int) -> Dict[str, List]:
+    tag = uuid.uuid4().hex[:8]
+    users = [{"id": str(uuid.uuid4()), "name": f"load-{tag}-{i}"} for i in range(voters)]
+    poll_rows = [{"id": str(uuid.uuid4()), "question": f"load-{tag} question {i}"} for i in range(polls)]
+    option_rows = [{"id": str(uuid.uuid4()), "poll_id": poll["id"], "option": f"option {j}"}
+                   for poll in poll_rows for j in range(options)]
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), users)
+        await conn.execute(insert(Poll), poll_rows)
+        await conn.execute(insert(Option), option_rows)
+    options_by_poll: Dict[str, List[str]] = {}
+    for option in option_rows:
+        options_by_poll.setdefault(option["poll_id"], []).append(option["id"])
+    return {"users": [user["id"] for user in users], "polls": options_by_poll}
+
+
+async def drop_fixtures(fixtures: Dict[str, List]):
+    poll_ids = list(fixtures["polls"])
+    async with engine.begin() as conn:
+        await conn.execute(delete(Vote).where(Vote.poll_id.in_(poll_ids)))
+        await conn.execute(delete(PollOptionCount).where(PollOptionCount.poll_id.in_(poll_ids)))
+        await conn.execute(delete(Option).where(Option.poll_id.in_(poll_ids)))
+        await conn.execute(delete(Poll).where(Poll.id.in_(poll_ids)))
+        await conn.execute(delete(User).where(User.id.in_(fixtures["users"])))
+
+
+async def wait_for(socket: ASGIWebSocket, match, timeout: float) -> dict:
+    while True:
+        frame = await socket.receive_json(timeout)
+        if match(frame):
+            return frame
+
+
+async def vote(socket: ASGIWebSocket, poll_id: str, option_id: str, timeout: float, acks: List[float],
+               tallies: List[float]):
+    start = time.perf_counter()
+    await socket.send_json({"type": "vote", "poll_id": poll_id, "option_id": option_id})
+    await wait_for(socket, lambda f: f.get("type") == "vote" and f.get("poll_id") == poll_id, timeout)
+    acks.append(time.perf_counter() - start)
+    await wait_for(socket, lambda f: f.get("poll_id") == poll_id and "votes" in f, timeout)
+    tallies.append(time.perf_counter() - start)
+
+
+async def run(args) -> dict:
+    broker = InMemoryBroker()
+    app = create_app(amqp_connection_factory=broker.connect)
+    fixtures = await create_fixtures(args.voters, args.polls, args.options)
+    try:
+        async with Lifespan(app):
+            await app.readiness.wait(timeout=30.0)
+            sockets = [ASGIWebSocket(app, f"/ws_vote/{user_id}", client_port=10000 + i)
+                       for i, user_id in enumerate(fixtures["users"])]
+
+            tracemalloc.start()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            baseline, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            accepted = await asyncio.gather(*(socket.connect() for socket in sockets))
+            await app.websocket_manager.flush()
+            connect_elapsed = time.perf_counter() - start
+            # voter_join frames held by the clients are not server memory
+            for socket in sockets:
+                socket.drain()
+            connected, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if not all(accepted):
+                raise RuntimeError(f"{accepted.count(False)} voters were not accepted, check the fixtures")
+
+            acks: List[float] = []
+            tallies: List[float] = []
+            failures = 0
+
+            async def voter(index: int, socket: ASGIWebSocket):
+                nonlocal failures
+                for poll_id, option_ids in fixtures["polls"].items():
+                    try:
+                        await vote(socket, poll_id, option_ids[index % len(option_ids)], args.timeout, acks,
+                                   tallies)
+                    except asyncio.TimeoutError:
+                        failures += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(voter(i, socket) for i, socket in enumerate(sockets)))
+            vote_elapsed = time.perf_counter() - start
+
+            await asyncio.gather(*(socket.close() for socket in sockets))
+            stats = {
+                "websocket": app.websocket_manager.stats(),
+                "tally_push": app.tally_push.stats(),
+                "ingest": app.vote_ingestor.stats(),
+                "amqp": app.pika_client.stats(),
+            }
+    finally:
+        await drop_fixtures(fixtures)
+
+    votes = len(acks)
+    return {
+        "votes": votes,
+        "failed": failures,
+        "connects_per_sec": args.voters / connect_elapsed,
+        "votes_per_sec": votes / vote_elapsed,
+        "ack_latency_ms": {f"p{p}": percentile(acks, p) * 1000 for p in (50, 90, 99)},
+        "tally_latency_ms": {f"p{p}": percentile(tallies, p) * 1000 for p in (50, 90, 99)},
+        "traced_bytes_per_connection": (connected - baseline) / args.voters,
+        "max_rss_growth_kib_per_connection": (rss_after - rss_before) / args.voters,
+        "stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voters", type=int, default=500)
+    parser.add_argument("--polls", type=int, default=5)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for an ack or tally")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "load_test.json"))
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "commit": commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "params": {"voters": args.voters, "polls": args.polls, "options": args.options},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as fp:
+        json.dump(report, fp, indent=2, default=str)
+
+    print(f"voters={args.voters} polls={args.polls} votes={results['votes']} failed={results['failed']}")
+    print(f"  {results['votes_per_sec']:,.0f} votes/s, {results['connects_per_sec']:,.0f} connects/s")
+    print("  ack   p50={p50:.1f}ms p90={p90:.1f}ms p99={p99:.1f}ms".format(**results["ack_latency_ms"]))
+    print("  tally p50={p50:.1f}ms p90={p90:.1f}ms p99={p99:.1f}ms".format(**results["tally_latency_ms"]))
+    print(f"  {results['traced_bytes_per_connection'] / 1024:.1f}KiB traced per connection, "
+          f"max RSS +{results['max_rss_growth_kib_per_connection']:.1f}KiB per connection")
+    print(f"  written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
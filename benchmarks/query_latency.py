@@ -0,0 +1,77 @@
+"""Per-query latency of the statement registry versus ad-hoc SQL.
+
+For each hot statement the registry version (one SQL string, prepared once per
+connection) is timed against the previous style: SQL text with the parameter formatted
+in, which Postgres parses and plans on every call. Read-only; runs against
+``DATABASE_URL`` and uses whatever polls and users exist.
+
+Usage: python -m benchmarks.query_latency [--iterations 500]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from benchmarks.support import percentile
+from project.database import engine
+from project.polls import queries
+from project.polls.models import Poll, User
+
+
+def adhoc_tally(poll_id: str):
+    return text(f"""select count(*) as total, v.poll_id, o.option, p.question
+    from votes v join options o on v.option_id = o.id
+    join polls p on o.poll_id = p.id where v.poll_id = '{poll_id}'
+    group by v.poll_id, o.option, p.question;""")
+
+
+def adhoc_user(user_id: str):
+    return text(f"SELECT users.id, users.name FROM users WHERE users.id = '{user_id}'")
+
+
+async def timed(conn, make_call, iterations: int):
+    samples = []
+    for i in range(iterations):
+        statement, params = make_call(i)
+        start = time.perf_counter()
+        await conn.execute(statement, params)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name: str, samples):
+    print(f"  {name:<28} p50={percentile(samples, 50) * 1e6:8.0f}us p99={percentile(samples, 99) * 1e6:8.0f}us")
+
+
+async def run(iterations: int):
+    async with engine.connect() as conn:
+        poll_ids = (await conn.execute(text(f"SELECT id FROM {Poll.__tablename__} LIMIT 50"))).scalars().all()
+        user_ids = (await conn.execute(text(f"SELECT id FROM {User.__tablename__} LIMIT 50"))).scalars().all()
+        poll_ids = poll_ids or ["missing-poll"]
+        user_ids = user_ids or ["missing-user"]
+
+        cases = {
+            "tally (registry)": lambda i: (queries.TALLY, {"poll_ids": [poll_ids[i % len(poll_ids)]]}),
+            "tally (f-string text)": lambda i: (adhoc_tally(poll_ids[i % len(poll_ids)]), {}),
+            "user_by_id (registry)": lambda i: (queries.USER_BY_ID, {"user_id": user_ids[i % len(user_ids)]}),
+            "user_by_id (f-string text)": lambda i: (adhoc_user(user_ids[i % len(user_ids)]), {}),
+            "users_by_ids (registry)": lambda i: (queries.USERS_BY_IDS, {"user_ids": user_ids[:1 + i % len(user_ids)]}),
+            "poll_options (registry)": lambda i: (queries.POLL_OPTIONS, {}),
+        }
+        print(f"iterations={iterations} polls={len(poll_ids)} users={len(user_ids)}")
+        for name, make_call in cases.items():
+            await timed(conn, make_call, min(iterations, 20))  # warm the connection
+            report(name, await timed(conn, make_call, iterations))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Encode/decode cost of realistic ``VoteNotification`` payloads.
+
+Outbound: the previous per-recipient ``jsonable_encoder`` + ``json.dumps`` (what
+``send_json`` did for every socket) versus encoding once with the configured serializer.
+Inbound: ``json.loads`` + ``Notification`` (whose validator re-serialized the message)
+versus ``serializer.loads`` + ``DecodedNotification``.
+
+Usage: python -m benchmarks.serialization [--options 20] [--recipients 1000] [--messages 2000]
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from project.schemas import VoteNotification, Notification, DecodedNotification
+from project.serializers import JsonSerializer, get_serializer
+
+
+def notification(options: int) -> VoteNotification:
+    return VoteNotification(
+        poll_id="5b0a4c0e-5c4e-4a4f-9d8e-6f5a0c1d2e3f",
+        question="Which of these options should we ship in the next release?",
+        votes=[{"option": f"Option number {i} with a descriptive label", "total": 1000 + i * 37}
+               for i in range(options)],
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--options", type=int, default=20)
+    parser.add_argument("--recipients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = notification(args.options).dict()
+    fast = get_serializer("auto")
+    stdlib = JsonSerializer()
+
+    def per_recipient():
+        for _ in range(args.recipients):
+            json.dumps(jsonable_encoder(payload))
+
+    before = timed(per_recipient, 5)
+    once_stdlib = timed(lambda: stdlib.dumps_text(payload), args.messages)
+    once_fast = timed(lambda: fast.dumps_text(payload), args.messages)
+    print(f"options={args.options} recipients={args.recipients} frame={len(fast.dumps(payload))}B "
+          f"serializer={fast.name}")
+    print(f"  outbound before (per recipient) : {before * 1000:8.2f}ms per broadcast")
+    print(f"  outbound once, json             : {once_stdlib * 1000:8.3f}ms per broadcast")
+    print(f"  outbound once, {fast.name:<16}: {once_fast * 1000:8.3f}ms per broadcast")
+
+    body = json.dumps({"broadcast": False, "recipients": ["a", "b"], "topic": "poll:x", "message": payload}).encode()
+    decode_before = timed(lambda: Notification.parse_obj(json.loads(body)), args.messages)
+    decode_after = timed(lambda: DecodedNotification.parse_obj(fast.loads(body)), args.messages)
+    print(f"  inbound before                  : {decode_before * 1e6:8.1f}us per message")
+    print(f"  inbound after                   : {decode_after * 1e6:8.1f}us per message")
+
+
+if __name__ == "__main__":
+    main()
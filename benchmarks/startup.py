@@ -0,0 +1,69 @@
+"""Time to first request and time to ready of a freshly created app.
+
+Runs the lifespan of ``create_app()`` against ``DATABASE_URL``, with ``InMemoryBroker``
+(``--broker-latency`` seconds per round trip) standing in for RabbitMQ, and measures from
+``create_app()`` until the lifespan startup completes, the first ``GET /`` is answered,
+``/ready`` reports 200 and the cache warm-up finished.
+
+Usage: python -m benchmarks.startup [--broker-latency 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.support import Lifespan
+from project import create_app
+from tests.broker import InMemoryBroker
+
+
+async def get(app, path: str) -> int:
+    """Status of an in-process HTTP GET."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def run(broker_latency: float):
+    start = time.perf_counter()
+    app = create_app(amqp_connection_factory=InMemoryBroker(latency=broker_latency).connect)
+    async with Lifespan(app):
+        started = time.perf_counter() - start
+        await get(app, "/")
+        first_request = time.perf_counter() - start
+        while await get(app, "/ready") != 200:
+            await asyncio.sleep(0.005)
+        ready = time.perf_counter() - start
+        while "caches" not in app.readiness.durations:
+            await asyncio.sleep(0.005)
+        warm = time.perf_counter() - start
+        report = app.readiness.report()
+    print(f"broker latency={broker_latency * 1000:.0f}ms")
+    print(f"  lifespan startup : {started * 1000:8.1f}ms")
+    print(f"  first request    : {first_request * 1000:8.1f}ms")
+    print(f"  ready            : {ready * 1000:8.1f}ms")
+    print(f"  caches warm      : {warm * 1000:8.1f}ms")
+    print(f"  steps            : {report['steps']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--broker-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.broker_latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import zlib
+from typing import Any, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Lifespan:
+    """Runs an ASGI app's startup and shutdown handlers: ``async with Lifespan(app): ...``"""
+
+    def __init__(self, app):
+        self.app = app
+        self._receive: "asyncio.Queue" = asyncio.Queue()
+        self._events = {"startup": asyncio.Event(), "shutdown": asyncio.Event()}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, message: dict):
+        phase, _, outcome = message["type"].partition(".")[2].rpartition(".")
+        if outcome == "failed":
+            raise RuntimeError(f"lifespan {phase} failed: {message.get('message')}")
+        self._events[phase].set()
+
+    async def __aenter__(self):
+        scope = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}, "state": {}}
+        self._task = asyncio.get_event_loop().create_task(self.app(scope, self._receive.get, self._send))
+        await self._receive.put({"type": "lifespan.startup"})
+        await self._wait("startup")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._receive.put({"type": "lifespan.shutdown"})
+        await self._wait("shutdown")
+        self._task.cancel()
+
+    async def _wait(self, phase: str):
+        waiter = asyncio.ensure_future(self._events[phase].wait())
+        await asyncio.wait({waiter, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            self._task.result()
+            raise RuntimeError(f"lifespan {phase} did not complete")
+
+
+class ASGIWebSocket:
+    """In-process WebSocket client talking to an ASGI app, without a server or sockets.
+
+    Received frames are decoded: JSON text as is, binary frames as zlib-compressed JSON.
+    """
+
+    def __init__(self, app, path: str, client_port: int = 50000):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+            "client": ("127.0.0.1", client_port), "server": ("testserver", 80), "subprotocols": [],
+        }
+        self._to_app: "asyncio.Queue" = asyncio.Queue()
+        self.frames: "asyncio.Queue" = asyncio.Queue()
+        self.accepted = asyncio.Event()
+        self.closed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, message: dict):
+        kind = message["type"]
+        if kind == "websocket.accept":
+            self.accepted.set()
+        elif kind == "websocket.send":
+            if message.get("bytes") is not None:
+                self.frames.put_nowait(json.loads(zlib.decompress(message["bytes"])))
+            else:
+                self.frames.put_nowait(json.loads(message["text"]))
+        elif kind == "websocket.close":
+            self.closed.set()
+
+    async def connect(self) -> bool:
+        """Returns whether the app accepted the connection."""
+        self._task = asyncio.get_event_loop().create_task(self.app(self.scope, self._to_app.get, self._send))
+        await self._to_app.put({"type": "websocket.connect"})
+        waiters = {asyncio.ensure_future(self.accepted.wait()), asyncio.ensure_future(self.closed.wait())}
+        await asyncio.wait(waiters | {self._task}, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        return self.accepted.is_set()
+
+    async def send_json(self, data: Any):
+        await self._to_app.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self, timeout: Optional[float] = None) -> Any:
+        return await asyncio.wait_for(self.frames.get(), timeout)
+
+    def drain(self) -> int:
+        """Discard received frames that were not read."""
+        count = self.frames.qsize()
+        self.frames = asyncio.Queue()
+        return count
+
+    async def close(self, code: int = 1000):
+        await self._to_app.put({"type": "websocket.disconnect", "code": code})
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except Exception:
+                self._task.cancel()
@@ -0,0 +1,104 @@
+"""Bytes on the wire and encode CPU of live tally pushes.
+
+A poll with ``--options`` options is pushed ``--ticks`` times to ``--watchers`` sockets,
+``--changed`` options changing between ticks. Compares the full ``VoteNotification`` per
+push, the snapshot+delta protocol of ``TallyPushScheduler``, the shared zlib binary
+encoding (compressed once per push), and permessage-deflate, simulated with one
+``compressobj`` per socket as the websocket server keeps it (context takeover).
+
+Usage: python -m benchmarks.tally_frames [--options 20] [--watchers 1000] [--ticks 200] [--changed 2]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+import zlib
+
+from project.core import compress_frame
+from project.polls.push import TallyPushScheduler
+from project.polls.tally import PollTally
+from project.serializers import serializer
+
+
+class StaticTallies:
+    def __init__(self, tally: PollTally):
+        self.tally = tally
+
+    async def get(self, poll_id: str):
+        return self.tally
+
+
+async def pushes(args):
+    """Frames produced by the scheduler, as (legacy notification, protocol frame) pairs."""
+    tally = PollTally(str(uuid.uuid4()), "Which of these options should we ship in the next release?")
+    for i in range(args.options):
+        tally.add_option(str(uuid.uuid4()), f"Option number {i} with a descriptive label", 1000 + i * 37)
+    published = []
+
+    async def publish(notifications, frames):
+        published.extend(zip(notifications, frames))
+
+    scheduler = TallyPushScheduler(StaticTallies(tally), publish)
+    option_ids = list(tally.totals)
+    for _ in range(args.ticks):
+        for option_id in random.sample(option_ids, args.changed):
+            tally.totals[option_id] += random.randint(1, 50)
+        scheduler.mark_dirty(tally.poll_id)
+        await scheduler.tick()
+    return published
+
+
+def measure(frames, encode) -> tuple:
+    start = time.perf_counter()
+    sent = sum(encode(frame) for frame in frames)
+    return sent, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--options", type=int, default=20)
+    parser.add_argument("--watchers", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--changed", type=int, default=2)
+    args = parser.parse_args()
+
+    published = asyncio.run(pushes(args))
+    full = [notification for notification, _ in published]
+    protocol = [frame for _, frame in published]
+    watchers = args.watchers
+
+    def shared(frame):
+        return len(serializer.dumps_text(frame)) * watchers
+
+    def shared_zlib(frame):
+        return len(compress_frame(serializer.dumps_text(frame))) * watchers
+
+    def per_socket_deflate(frames):
+        # permessage-deflate compresses every message once per socket
+        compressors = [zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS) for _ in range(min(watchers, 100))]
+        scale = watchers / len(compressors)
+
+        def encode(frame):
+            text = serializer.dumps_text(frame).encode()
+            return sum(len(c.compress(text) + c.flush(zlib.Z_SYNC_FLUSH)) for c in compressors) * scale
+        sent, elapsed = measure(frames, encode)
+        return sent, elapsed * scale
+
+    rows = [
+        ("full, text", measure(full, shared)),
+        ("full, shared zlib", measure(full, shared_zlib)),
+        ("full, permessage-deflate", per_socket_deflate(full)),
+        ("delta, text", measure(protocol, shared)),
+        ("delta, permessage-deflate", per_socket_deflate(protocol)),
+    ]
+    print(f"options={args.options} watchers={watchers} pushes={len(published)} changed/tick={args.changed} "
+          f"serializer={serializer.name}")
+    baseline = rows[0][1][0]
+    for name, (sent, elapsed) in rows:
+        print(f"  {name:<26}: {sent / len(published) / 1024:10.1f}KiB/push ({sent / baseline:6.1%})"
+              f"  {elapsed / len(published) * 1000:8.3f}ms CPU/push")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Votes/sec of the per-message insert path versus the batched ``VoteIngestor``.
+
+Runs against the database in ``DATABASE_URL`` and removes the votes and counts it created.
+
+Usage: python -m benchmarks.vote_ingest [--votes 5000] [--voters 500]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from project.database import engine
+from project.polls.ingest import VoteIngestor
+from project.polls.models import PollOptionCount, Vote
+
+
+async def per_message(poll_id: str, option_id: str, user_id: str):
+    """The previous on_receive path: one connection, transaction and commit per vote."""
+    async with engine.connect() as conn:
+        async with conn.begin():
+            session = AsyncSession(conn)
+            session.add(Vote(id=str(uuid.uuid4()), poll_id=poll_id, option_id=option_id, user_id=user_id))
+            await session.commit()
+
+
+async def drive(submit, votes: int, voters: int) -> float:
+    poll_id = f"bench-{uuid.uuid4()}"
+    queue = asyncio.Queue()
+    for i in range(votes):
+        queue.put_nowait(f"voter-{i}")
+
+    async def voter():
+        while not queue.empty():
+            await submit(poll_id, "bench-option", queue.get_nowait())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(voter() for _ in range(voters)))
+    elapsed = time.perf_counter() - start
+
+    async with engine.begin() as conn:
+        await conn.execute(delete(Vote).where(Vote.poll_id == poll_id))
+        await conn.execute(delete(PollOptionCount).where(PollOptionCount.poll_id == poll_id))
+    return votes / elapsed
+
+
+async def run(votes: int, voters: int, batch_size: int, max_latency: float):
+    baseline = await drive(per_message, votes, voters)
+    print(f"per-message : {baseline:,.0f} votes/sec")
+
+    ingestor = VoteIngestor(engine, max_batch_size=batch_size, max_latency=max_latency)
+    ingestor.start()
+    batched = await drive(ingestor.submit, votes, voters)
+    await ingestor.stop()
+    print(f"batched     : {batched:,.0f} votes/sec ({batched / baseline:.1f}x) {ingestor.stats()}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--voters", type=int, default=500, help="concurrent WebSocket connections")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-latency", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(run(args.votes, args.voters, args.batch_size, args.max_latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Requests/sec of the /ws_client page before and after caching.
+
+"before" re-runs the previous string-concatenation render for every request (the two
+queries it also ran per request are not included, so this understates the gain);
+"after" serves ``WsClientPage`` through a real Starlette app, including conditional
+requests answered with 304. The database is replaced by synthetic rows.
+
+Usage: python -m benchmarks.ws_client_page [--users 5000] [--options 50] [--requests 2000]
+"""
+import argparse
+import asyncio
+import time
+
+from starlette.requests import Request
+
+from project.pages import WsClientPage, HEAD
+
+
+def concatenation_render(users, options) -> str:
+    """The previous ws_client body, building the page with repeated ``+=``."""
+    html = HEAD
+    if users:
+        html += """
+                    <h3 id="h1-title">Users</h3>
+                    <select user_id="select_id" style="width:30%" onchange="login(this)">
+                    <option selected="selected" value="-">Select</option>
+                    """
+        for user_id, name in users:
+            html += f"""
+                                  <option value="{user_id}">{name}</option>
+                                    """
+    html += """</select>"""
+    html += """<hr />"""
+    if options:
+        html += f"<h3 id=\"h1-title\">{options[0][1]}</h3>"
+        html += f"<input type=\"hidden\" id=\"poll_id\" value=\"{options[0][0]}\">"
+        html += "<select id=\"select-poll\" disabled style=\"width:100%\">"
+        for poll_id, question, option_id, option in options:
+            html += f"""<option value="{option_id}">{option}</option>"""
+        html += """</select>"""
+    html += """<hr /><button id=\"btn-vote\" disabled>Vote!</button><br />"""
+    return html
+
+
+class SyntheticPage(WsClientPage):
+    def __init__(self, users, options):
+        super().__init__(engine=None, max_age=0)
+        self._rows = users, options
+
+    async def _load(self):
+        return self._rows
+
+
+def request(headers=()) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/ws_client",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers]})
+
+
+async def run(users: int, options: int, requests: int):
+    user_rows = [(f"user-{i:08d}", f"Voter {i}") for i in range(users)]
+    option_rows = [("poll-1", "Which option do you prefer?", f"option-{i}", f"Option {i}") for i in range(options)]
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        concatenation_render(user_rows, option_rows).encode()
+    before = requests / (time.perf_counter() - start)
+
+    page = SyntheticPage(user_rows, option_rows)
+    start = time.perf_counter()
+    first = await page.response(request())
+    rebuild = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await page.response(request())
+    after = requests / (time.perf_counter() - start)
+
+    conditional = [("If-None-Match", first.headers["etag"])]
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await page.response(request(conditional))
+    not_modified = requests / (time.perf_counter() - start)
+
+    print(f"users={users} options={options} page={len(first.body) / 1024:.0f}KiB rebuild={rebuild * 1000:.1f}ms")
+    print(f"  before (render per request): {before:,.0f} req/s")
+    print(f"  after  (cached, 200)       : {after:,.0f} req/s")
+    print(f"  after  (cached, 304)       : {not_modified:,.0f} req/s (status {response.status_code})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--options", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.options, args.requests))
+
+
+if __name__ == "__main__":
+    main()
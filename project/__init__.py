@@ -1,170 +1,153 @@
 import asyncio
-import uuid
-from typing import Any
-
-from fastapi import FastAPI, WebSocket, Depends
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse
+import inspect
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, List
+
+from aio_pika import connect_robust
+from fastapi import FastAPI, WebSocket, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import parse_obj_as
-from rich import inspect
-from rich.console import Console
-from sqlalchemy import select, text
-from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.endpoints import WebSocketEndpoint
 from starlette.types import ASGIApp, Scope, Receive, Send
 
 from project import database
+from project.cache import UserCache
+from project.cluster import ClusterRouter
 from project.config import settings
-from project.core import WebSocketManager, PikaClient
-from project.database import get_session
-from project.polls.models import User as UserModel, Vote as VoteModel
-from project.schemas import Vote as VoteSchema, User as UserSchema, Notification as NotificationSchema, \
-    VoteNotification as VoteNotificationSchema
-
-console = Console()
+from project.log import VOTE_LOGGER, configure_logging, shutdown_logging, dropped_records
+from project.metrics import Registry
+from project.core import Connection, WebSocketManager, PikaClient, poll_topic, tally_topic
+from project.pages import WsClientPage
+from project.polls.dedup import VotedSet, VotedSetReplicator
+from project.polls.ingest import InvalidVote, VoteIngestor
+from project.polls.push import TallyPushScheduler
+from project.polls.tally import TallyCache
+from project.readiness import Readiness
+from project.schemas import Notification as NotificationSchema
+
+logger = logging.getLogger(__name__)
+vote_logger = logging.getLogger(VOTE_LOGGER)
 wm: WebSocketManager = None
 engine = database.engine
-loop = asyncio.get_event_loop()
 rabbitmq_queue_name = "first_queue"
 
 
-def create_app() -> FastAPI:
+async def run_shutdown_steps(steps: List[Callable[[], Any]]):
+    """Run shutdown steps in order. Each one runs even if an earlier step failed; failures
+    are logged, so the connections and the log queue are always released.
+    """
+    for step in steps:
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("Shutdown step %s failed", getattr(step, "__qualname__", step))
+
+
+def create_app(amqp_connection_factory=connect_robust) -> FastAPI:
+    """Build the application; ``amqp_connection_factory`` replaces ``aio_pika.connect_robust``."""
+    global wm
     app = FastAPI()
+    configure_logging(settings.LOG_LEVEL, vote_sample_rate=settings.LOG_VOTE_SAMPLE_RATE,
+                      queue_size=settings.LOG_QUEUE_SIZE)
+    wm = websocket_manager = WebSocketManager(
+        send_concurrency=settings.WEBSOCKET_SEND_CONCURRENCY,
+        send_timeout=settings.WEBSOCKET_SEND_TIMEOUT,
+        queue_size=settings.WEBSOCKET_QUEUE_SIZE,
+        overflow_policy=settings.WEBSOCKET_OVERFLOW_POLICY,
+        compress_min_size=settings.WEBSOCKET_COMPRESS_MIN_SIZE
+    )
+    tally_cache = TallyCache(engine, reconcile_interval=settings.TALLY_RECONCILE_INTERVAL)
+    voted_set = VotedSet(engine, max_polls=settings.VOTE_DEDUP_MAX_POLLS,
+                         max_entries=settings.VOTE_DEDUP_MAX_ENTRIES,
+                         max_poll_voters=settings.VOTE_DEDUP_MAX_POLL_VOTERS,
+                         idempotency_ttl=settings.VOTE_IDEMPOTENCY_TTL) if settings.VOTE_DEDUP else None
+
+    def vote_counted(poll_id: str, option_id: str, total: int):
+        tally_cache.set_total(poll_id, option_id, total)
+        # Coalesced with other votes on the poll and pushed on the next tick.
+        tally_push.mark_dirty(poll_id)
+
+    vote_ingestor = VoteIngestor(engine, max_batch_size=settings.VOTE_BATCH_SIZE,
+                                 max_latency=settings.VOTE_BATCH_MAX_LATENCY, voted=voted_set,
+                                 on_counted=vote_counted)
+    user_cache = UserCache(engine, maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+    ws_client_page = WsClientPage(engine, max_age=settings.WS_CLIENT_PAGE_MAX_AGE)
 
     from project.polls import polls_router  # new
     app.include_router(polls_router)  # new
 
-    @app.on_event("startup")
-    async def startup_event():
-        # inspect(settings.DATABASE_URL, methods=True)
-        # Perform connection
-        console.print("=====================================")
-        console.print("Connecting to database...", style="bold red")
-        inspect(settings.DATABASE_URL, methods=True)
-        console.print("=====================================")
-        # send_external_message_sync(queue_name, "Chatbot Webhook API is running")
-        await database.connect()
+    readiness = Readiness()
 
+    async def connect_broker():
         await pika_client.init_connection()
-        task = loop.create_task(pika_client.consume(loop, rabbitmq_queue_name))
-        await task
-
-    @app.on_event("shutdown")
-    async def shutdown_event():
-        await database.disconnect()
+        if cluster_router is not None:
+            await cluster_router.start()
+        if voted_replicator is not None:
+            await voted_replicator.start()
+        await pika_client.consume(asyncio.get_event_loop(), rabbitmq_queue_name)
+
+    async def warm_caches():
+        await ws_client_page.get()
+        if settings.USER_CACHE_WARM:
+            await user_cache.warm(settings.USER_CACHE_WARM)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Nothing here waits on the database or the broker: requests are served right away
+        # and /ready reports 503 until the required steps are done. The schema is managed
+        # by Alembic.
+        logger.info("Connecting to database %s", engine.url.render_as_string(hide_password=True))
+        readiness.start()
+        tally_cache.start()
+        vote_ingestor.start()
+        tally_push.start()
+        readiness.run("database", lambda: database.connect(settings.DATABASE_POOL_SIZE))
+        readiness.run("broker", connect_broker)
+        readiness.run("caches", warm_caches, required=False)
+        try:
+            yield
+        finally:
+            steps = [readiness.cancel, vote_ingestor.stop, tally_push.stop, tally_cache.stop]
+            if cluster_router is not None:
+                steps.append(cluster_router.stop)
+            if voted_replicator is not None:
+                steps.append(voted_replicator.stop)
+            steps += [pika_client.close, database.disconnect, shutdown_logging]
+            await run_shutdown_steps(steps)
+
+    app.router.lifespan_context = lifespan
 
     class WebSocketManagerEventMiddleware:  # pylint: disable=too-few-public-methods
         """Middleware to add the websocket_manager to the scope."""
 
-        def __init__(self, app: ASGIApp):
+        def __init__(self, app: ASGIApp, websocket_manager: WebSocketManager, readiness: Readiness = None):
             self._app = app
-            self._websocket_manager = WebSocketManager()
+            self._websocket_manager = websocket_manager
+            self._readiness = readiness
 
         async def __call__(self, scope: Scope, receive: Receive, send: Send):
             if scope["type"] in ("lifespan", "http", "websocket"):
                 scope["websocket_manager"] = self._websocket_manager
+            if self._readiness is not None and scope["type"] != "lifespan":
+                self._readiness.request_started()
             await self._app(scope, receive, send)
 
-    app.add_middleware(WebSocketManagerEventMiddleware)
+    app.add_middleware(WebSocketManagerEventMiddleware, websocket_manager=websocket_manager, readiness=readiness)
 
     @app.get("/")
     async def root():
         return {"data": "Hello World!"}
 
+    @app.get("/ready", include_in_schema=False)
+    async def ready():
+        return JSONResponse(readiness.report(), status_code=200 if readiness.ready else 503)
+
     @app.get("/ws_client")
-    async def ws_client(session: AsyncSession = Depends(get_session)):
-        """ Select users """
-        users = await session.execute(select(UserModel))
-        users = users.scalars().all()
-
-        """ Select polls """
-        polls = await session.execute(
-            text("SELECT p.id as p_id, p.question as question, o.id as o_id, o.option as option"
-                 " FROM polls AS p JOIN options AS o ON p.id = o.poll_id"))
-        polls = polls.fetchall()
-
-        html = """
-            <!DOCTYPE html>
-        	<html>
-        	    <head>
-        	        <title>Polling Websocket App</title>
-        	        <script type="text/javascript">
-        	            var ws = null;
-        	            var id = null;
-                        function login(select_object) {
-                            var id = select_object.value;
-                            const ws_url = '/ws_vote/' + id;
-                            ws = new WebSocket((location.protocol === 'https:' ? 'wss' : 'ws') + '://app.rezayogaswara.dev' + ws_url);
-                            if (id !== undefined) {
-                                ws.onmessage = function(event) {
-                                    console.log(event.data);
-                                    var messages = document.getElementById('messages');
-                                    var data = document.createElement('li');
-                                    var content = document.createTextNode(event.data);
-                                    data.appendChild(content);
-                                    messages.appendChild(data);
-                                    
-                                    m = JSON.parse(event.data);
-                                    if (m.type === "voter_join") {
-                                        document.getElementById(\"btn-vote\").disabled = false;
-                                        document.getElementById(\"select-poll\").disabled = false;
-                                    }
-                                    
-                                    document.getElementById(\"btn-vote\").onclick = function() {
-                                        vote();
-                                    };                           
-                                };
-                                
-                                select_object.disabled = true;
-                            }
-                        }
-
-                        function vote() {
-                            document.getElementById(\"btn-vote\").disabled = true;
-                            document.getElementById(\"select-poll\").disabled = true;
-                            ws.send(JSON.stringify({ "type": "vote", "poll_id": document.getElementById(\"poll_id\").value, "option_id": document.getElementById(\"select-poll\").value }));
-                        }
-        	        </script>
-        	    </head>
-        	    <body>"""
-
-        if users:
-            html += """
-                    <h3 id="h1-title">Users</h3>
-                    <select user_id="select_id" style="width:30%" onchange="login(this)">
-                    <option selected="selected" value="-">Select</option>
-                    """
-            for user in users:
-                html += f"""
-                                  <option value="{user.id}">{user.name}</option>
-                                    """
-
-        html += """
-                			</select>
-                			"""
-
-        html += """<hr />"""
-
-        if polls:
-            data = [_._asdict() for _ in polls]
-            html += f"<h3 id=\"h1-title\">{data[0]['question']}</h3>"
-            html += f"<input type=\"hidden\" id=\"poll_id\" value=\"{data[0]['p_id']}\">"
-            html += "<select id=\"select-poll\" disabled style=\"width:100%\">"
-            for poll in data:
-                html += f"""<option value="{poll['o_id']}">{poll['option']}</option>"""
-
-            html += """</select>"""
-
-        html += """<hr />"""
-        html += """<button id=\"btn-vote\" disabled>Vote!</button><br />"""
-
-        html += """
-                	        <div id="messages"></div>
-                	    </body>
-                	</html>
-                    """
-
-        return HTMLResponse(html)
+    async def ws_client(request: Request):
+        return await ws_client_page.response(request)
 
     @app.websocket("/ws/{id}")
     async def websocket_endpoint(websocket: WebSocket, id: str):
@@ -173,7 +156,7 @@ def create_app() -> FastAPI:
             user_connected = f"User {id} connected!"
             data = await websocket.receive_text()
             await websocket.send_text(f"{data} - {user_connected}")
-            console.print(f"{data}")
+            logger.debug("%s", data)
 
     @app.websocket_route("/ws_vote/{id}", name="ws_vote")
     class VoteApp(WebSocketEndpoint):
@@ -183,6 +166,12 @@ def create_app() -> FastAPI:
             super().__init__(*args, **kwargs)
             self.websocket_manager: WebSocketManager = None
             self.user_id: str = None
+            self.connection: Connection = None
+            # "delta" once the client subscribed with the snapshot+delta tally protocol
+            self.protocol: str = "full"
+
+        def poll_topic(self, poll_id: str) -> str:
+            return tally_topic(poll_id) if self.protocol == "delta" else poll_topic(poll_id)
 
         async def on_connect(self, websocket: WebSocket):
             global wm
@@ -194,123 +183,189 @@ def create_app() -> FastAPI:
             await websocket.accept()
             id_ = websocket.path_params['id']
 
-            async with engine.connect() as conn:
-                async with conn.begin():
-                    session = AsyncSession(conn)
-                    user = await session.execute(select(UserModel).where(UserModel.id == id_))
-                    user = user.scalars().first()
+            user = await user_cache.get(id_)
 
-                    u = UserSchema.from_orm(user)
+            if user is not None:
+                self.connection = self.websocket_manager.add_user(user.id, user.name, websocket)
 
-                    if user is not None:
-                        self.websocket_manager.add_user(u.id, u.name, websocket)
+                logger.debug("%d users connected", len(self.websocket_manager))
 
-                        console.print("====================================")
-                        console.print(self.websocket_manager.__len__())
-                        console.print("====================================")
+                await self.websocket_manager.broadcast_all_users(
+                    {"type": "voter_join", "data": user.name, "user_id": user.id}
+                )
 
-                        await self.websocket_manager.broadcast_all_users(
-                            {"type": "voter_join", "data": u.name, "user_id": u.id}
-                        )
-
-                        user_id = user.id
-                        self.user_id = user_id
-                        console.print(f"User {user_id} - {user.name} connected!")
-                    else:
-                        await websocket.send_json({"type": "error", "data": "User not found!"})
-                        await websocket.close()
+                self.user_id = user.id
+                logger.info("User %s - %s connected!", user.id, user.name)
+            else:
+                await websocket.send_json({"type": "error", "data": "User not found!"})
+                await websocket.close()
 
         async def on_receive(self, websocket: WebSocket, data: Any):
             if self.user_id is None:
                 raise RuntimeError("WebSocketManager.on_receive() called without a valid user_id")
             else:
 
-                if data['type'] is not None:
+                if data['type'] == "subscribe":
+                    if data.get('protocol') == "delta":
+                        self.protocol = "delta"
+                    if data.get('compress'):
+                        self.connection.compress = True
+                    self.websocket_manager.subscribe(self.poll_topic(data['poll_id']), self.connection)
+                    if self.protocol == "delta":
+                        await self.send_snapshot(data['poll_id'])
+                    return
+
+                if data['type'] == "unsubscribe":
+                    self.websocket_manager.unsubscribe(self.poll_topic(data['poll_id']), self.connection)
+                    return
 
-                    async with engine.connect() as conn:
-                        async with conn.begin():
-                            session = AsyncSession(conn)
-                            try:
-                                vote = VoteModel(id=str(uuid.uuid4()), user_id=self.user_id, poll_id=data['poll_id'],
-                                                 option_id=data['option_id'])
-
-                                session.add(vote)
-                                await session.commit()
-
-                                await self.websocket_manager.broadcast_by_user_id(self.user_id, data)
-                                console.print(f"User {self.user_id} - {data['option_id']} voted!")
-
-                                vote_count = await get_vote_count(session, data['poll_id'])
-
-                                if vote_count:
-                                    data = [_._asdict() for _ in vote_count]
-                                    votes = []
-                                    for v in data:
-                                        votes.append({
-                                            "option": v['option'],
-                                            "total": v['total']
-                                        })
-
-                                    vote_notification = VoteNotificationSchema(
-                                        poll_id=data[0]['poll_id'],
-                                        question=data[0]['question'],
-                                        votes=votes
-                                    )
-
-                                await pika_client.init_connection()
-                                await pika_client.publish_async(queue_name=rabbitmq_queue_name, message={
-                                    "broadcast": False,
-                                    "recipients": [
-                                        "8fd67538-521c-403b-97b4-542ec7d3fb7f",
-                                        "67afb393-a8f4-44b1-9566-a7711734f77d"
-                                    ],
-                                    "message": jsonable_encoder(vote_notification.dict())
-                                })
-
-                            except Exception as e:
-                                inspect(e, methods=True)
-                                await session.rollback()
-
-                                await self.websocket_manager.broadcast_by_user_id(self.user_id, {"type": "error",
-                                                                                                 "data": "Vote failed, already voted!"})
-                                console.print(f"User {self.user_id} - {data['option_id']} vote failed!")
-                                raise e
+                if data['type'] == "resync":
+                    await self.send_snapshot(data['poll_id'])
+                    return
+
+                if data['type'] is not None:
+                    try:
+                        # A retry carrying the same idempotency_key gets the first result again
+                        voted = await vote_ingestor.submit(data.get('poll_id'), data.get('option_id'), self.user_id,
+                                                           data.get('idempotency_key'))
+                    except InvalidVote as e:
+                        # Malformed ids: answer this client, keep its socket open
+                        await self.websocket_manager.broadcast_by_user_id(self.user_id, {"type": "error",
+                                                                                         "data": f"Invalid vote: {e}"})
+                        return
+                    except Exception as e:
+                        await self.websocket_manager.broadcast_by_user_id(self.user_id, {"type": "error",
+                                                                                         "data": "Vote failed!"})
+                        logger.exception("User %s - %s vote failed!", self.user_id, data['option_id'])
+                        raise e
+
+                    if not voted:
+                        await self.websocket_manager.broadcast_by_user_id(
+                            self.user_id, {"type": "error", "data": "Vote failed, already voted!"})
+                        vote_logger.info("User %s - %s vote failed, already voted!", self.user_id, data['option_id'])
+                        return
+
+                    await self.websocket_manager.broadcast_by_user_id(self.user_id, data)
+                    vote_logger.info("User %s - %s voted!", self.user_id, data['option_id'])
+
+                    # The tally was updated by vote_counted when the vote was inserted
+                    self.websocket_manager.subscribe(self.poll_topic(data['poll_id']), self.connection)
+
+        async def send_snapshot(self, poll_id: str):
+            frame = await tally_push.snapshot(poll_id)
+            if frame is not None:
+                self.websocket_manager.send_to_connection(self.connection, frame)
 
         async def on_disconnect(self, websocket: WebSocket, close_code: int):
             if self.user_id is not None:
                 # await self.websocket_manager.broadcast_all_users(
                 #     {"type": "voter_leave", "data": self.user_id}
                 # )
-                self.websocket_manager.remove_user(self.user_id)
-                console.print(f"User {self.user_id} disconnected!")
+                self.websocket_manager.remove_user(self.user_id, websocket)
+                logger.info("User %s disconnected!", self.user_id)
                 websocket.close()
 
     def log_incoming_message(message: dict):
-        console.print(f"Message received: {message}")
-        if wm is not None:
-            users = wm.users.keys()
-            notification = parse_obj_as(NotificationSchema, message)
-
-            # console.print(f"Users: {users}")
+        logger.debug("Message received: %s", message)
+        deliver_local([parse_obj_as(NotificationSchema, message)])
 
+    def deliver_local(notifications: List[NotificationSchema]):
+        """Deliver notifications to sockets on this worker, encoding each message once."""
+        # Sends are queued per connection, so a stalled socket never blocks the consumer.
+        for notification in notifications:
             if notification.broadcast is True:
-                loop.create_task(wm.broadcast_all_users(jsonable_encoder(notification.message)))
+                websocket_manager.send_to_all(notification.message)
             else:
-                r = sorted(notification.recipients)
-                active_user_in_websocket = sorted(users)
-                intersection = set(r).intersection(set(active_user_in_websocket))
-                if len(intersection) > 0:
-                    for user_id in intersection:
-                        loop.create_task(wm.broadcast_by_user_id(user_id, jsonable_encoder(notification.message)))
-
-    async def get_vote_count(session: AsyncSession, poll_id: str):
-        vote_count = await session.execute(
-            text(f"""select count(*) as total, v.poll_id, o.option, p.question
-    from votes v join options o on v.option_id = o.id
-    join polls p on o.poll_id = p.id where v.poll_id = '{poll_id}'
-    group by v.poll_id, o.option, p.question;"""))
-        return vote_count.fetchall()
-
-    pika_client = PikaClient(log_incoming_message)
+                websocket_manager.deliver(notification.message, notification.recipients, notification.topic)
+
+    async def dispatch_notifications(notifications: List[NotificationSchema]):
+        """Deliver a batch of consumed notifications, across workers in cluster mode."""
+        if cluster_router is not None:
+            await cluster_router.route(notifications)
+        else:
+            deliver_local(notifications)
+
+    pika_client = PikaClient(log_incoming_message, channel_pool_size=settings.RABBITMQ_CHANNEL_POOL_SIZE,
+                             batch_callable=dispatch_notifications,
+                             prefetch_count=settings.RABBITMQ_PREFETCH_COUNT,
+                             consumer_workers=settings.RABBITMQ_CONSUMER_WORKERS,
+                             consume_batch_size=settings.RABBITMQ_CONSUME_BATCH_SIZE,
+                             connection_factory=amqp_connection_factory)
+
+    async def publish_tallies(vote_notifications: List[dict], frames: List[dict]):
+        # Tallies reach the sockets subscribed to the poll, including those of its voters
+        await pika_client.publish_batch([{
+            "broadcast": False,
+            "topic": poll_topic(vote_notification["poll_id"]),
+            "message": vote_notification
+        } for vote_notification in vote_notifications] + [{
+            "broadcast": False,
+            "topic": tally_topic(frame["poll_id"]),
+            "message": frame
+        } for frame in frames], rabbitmq_queue_name)
+
+    # Other workers' votes only reach this worker's cache through the database
+    tally_push = TallyPushScheduler(tally_cache, publish_tallies, interval=settings.TALLY_PUSH_INTERVAL,
+                                    refresh=settings.CLUSTER_MODE)
+    # Totals corrected by reconcile (votes through other workers) are pushed like new votes
+    tally_cache.on_changed = tally_push.mark_dirty
+    cluster_router = ClusterRouter(pika_client, websocket_manager, deliver_local,
+                                   heartbeat_interval=settings.CLUSTER_HEARTBEAT_INTERVAL) \
+        if settings.CLUSTER_MODE else None
+    voted_replicator = VotedSetReplicator(pika_client, voted_set) \
+        if voted_set is not None and settings.VOTE_DEDUP_SHARED else None
+
+    # Read on scrape from the histograms and counters the components keep anyway
+    metrics = Registry(prefix="app_")
+    metrics.histogram("vote_commit_seconds", vote_ingestor.commit_latency, "Vote submitted until its batch committed")
+    metrics.histogram("vote_insert_seconds", vote_ingestor.flush_latency, "Batched vote INSERT transaction")
+    metrics.counter("votes_total", lambda: vote_ingestor.votes, "Votes written, including duplicates")
+    metrics.counter("votes_duplicate_total", lambda: vote_ingestor.duplicates, "Votes rejected as duplicates")
+    metrics.counter("votes_dedup_saved_total", lambda: vote_ingestor.stats()["saved_round_trips"],
+                    "Repeat votes answered from memory without a database round trip")
+    metrics.gauge("votes_pending", lambda: vote_ingestor.stats()["pending"], "Votes waiting for a batch")
+    metrics.histogram("tally_query_seconds", tally_cache.load_latency, "Tally warm-up and reconcile queries")
+    metrics.histogram("tally_push_seconds", tally_push.tick_latency, "Coalesced tally push tick")
+    metrics.counter("tally_pushes_total", lambda: tally_push.pushed, "Poll tallies pushed")
+    metrics.histogram("amqp_publish_seconds", pika_client.publish_latency, "Publish batch until confirmed")
+    metrics.counter("amqp_published_total", pika_client.published, "Messages published")
+    metrics.counter("amqp_consumed_total", pika_client.consumed, "Messages consumed")
+    metrics.counter("amqp_rejected_total", lambda: pika_client.rejected, "Undecodable messages rejected")
+    metrics.histogram("amqp_batch_seconds", pika_client.batch_latency, "Handling of a consumed batch")
+    metrics.histogram("amqp_processing_seconds", pika_client.processing_latency, "Message received until acked")
+    metrics.histogram("ws_fanout_seconds", websocket_manager.fanout_latency, "Encoding and queueing one message")
+    metrics.histogram("ws_send_seconds", websocket_manager.send_latency, "Single socket write")
+    metrics.gauge("ws_connections", lambda: len(websocket_manager), "Connected sockets")
+    metrics.gauge("ws_queued_frames", lambda: sum(websocket_manager.queue_depths()), "Frames in outbound queues")
+    metrics.gauge("ws_max_queue_depth", lambda: max(websocket_manager.queue_depths(), default=0),
+                  "Deepest outbound queue")
+    metrics.counter("ws_sent_total", lambda: websocket_manager.sent, "Frames written")
+    metrics.counter("ws_dropped_total", lambda: websocket_manager.dropped, "Frames dropped on overflow")
+    metrics.counter("ws_coalesced_total", lambda: websocket_manager.coalesced, "Frames superseded while queued")
+    metrics.counter("ws_evicted_total", lambda: websocket_manager.evicted, "Connections evicted")
+    metrics.histogram("db_pool_checkout_seconds", database.pool_checkout_wait, "Wait for a pooled connection")
+    metrics.histogram("db_pool_utilization", database.pool_utilization, "Checked-out share of the pool")
+    metrics.counter("user_cache_hits_total", lambda: user_cache.hits, "User lookups served from cache")
+    metrics.counter("user_cache_misses_total", lambda: user_cache.misses, "User lookups that missed")
+    metrics.counter("log_records_dropped_total", dropped_records, "Log records dropped on a full queue")
+    metrics.gauge("ready", lambda: int(readiness.ready), "1 once the database and broker are connected")
+    metrics.gauge("ready_seconds", lambda: readiness.ready_after or 0.0, "App created until ready")
+    metrics.gauge("first_request_seconds", lambda: readiness.first_request_after or 0.0,
+                  "App created until the first request")
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    app.metrics = metrics
+    app.readiness = readiness
+    app.websocket_manager = websocket_manager
     app.pika_client = pika_client
+    app.cluster_router = cluster_router
+    app.tally_cache = tally_cache
+    app.tally_push = tally_push
+    app.user_cache = user_cache
+    app.ws_client_page = ws_client_page
+    app.vote_ingestor = vote_ingestor
+    app.voted_set = voted_set
     return app
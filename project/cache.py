@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.polls import queries
+from project.schemas import User
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """Concurrent loads of the same key share one call.
+
+    The load runs in a task of its own and every caller awaits it shielded, so a caller
+    that is cancelled, the first one included, does not cancel it for the others. Its
+    result or exception goes to every caller.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def _run(self, key: Hashable, load: Callable[[Hashable], Awaitable[Any]]) -> Any:
+        try:
+            return await load(key)
+        finally:
+            del self._inflight[key]
+
+    async def run(self, key: Hashable, load: Callable[[Hashable], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, load))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+class AsyncCache:
+    """TTL + LRU cache for async lookups with single-flight loading.
+
+    Concurrent misses for the same key share one call to ``load_one``; ``prefetch`` and
+    ``get_many`` load every missing key with a single ``load_many`` call. Lookups that
+    find nothing (``None``) are cached for ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, load_one: Callable[[Hashable], Awaitable[Any]],
+                 load_many: Optional[Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]] = None,
+                 maxsize: int = 100_000, ttl: float = 60.0, negative_ttl: float = 5.0):
+        self._load_one = load_one
+        self._load_many = load_many
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        ttl = self._ttl if value is not None else self._negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: Hashable) -> Any:
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return await self._inflight.run(key, self._load)
+
+    async def _load(self, key: Hashable) -> Any:
+        self.loads += 1
+        value = await self._load_one(key)
+        self._store(key, value)
+        return value
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Look up several keys, loading all missing ones in one batch.
+        """
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        for key in dict.fromkeys(keys):
+            value = self._lookup(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                self.hits += 1
+                found[key] = value
+        if missing:
+            self.misses += len(missing)
+            found.update(await self._fetch_many(missing))
+        return found
+
+    async def _fetch_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        if self._load_many is None:
+            return dict(zip(keys, await asyncio.gather(*(self.get(key) for key in keys))))
+        self.loads += 1
+        loaded = await self._load_many(keys)
+        for key in keys:
+            self._store(key, loaded.get(key))
+        return {key: loaded.get(key) for key in keys}
+
+    async def prefetch(self, keys: Iterable[Hashable]) -> int:
+        """Warm the cache for ``keys``; returns how many had to be loaded.
+        """
+        missing = [key for key in dict.fromkeys(keys) if self._lookup(key) is _MISSING]
+        if missing:
+            await self._fetch_many(missing)
+        return len(missing)
+
+    def peek(self, key: Hashable) -> Any:
+        """Cached value of ``key`` or None, without loading it.
+        """
+        value = self._lookup(key)
+        return None if value is _MISSING else value
+
+    def invalidate(self, key: Hashable = _MISSING):
+        if key is _MISSING:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self._inflight.coalesced,
+            "loads": self.loads,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class UserCache(AsyncCache):
+    """Users looked up on WebSocket connect, as ``project.schemas.User``."""
+
+    def __init__(self, engine: AsyncEngine, **kwargs):
+        self._engine = engine
+        super().__init__(self._load_user, self._load_users, **kwargs)
+
+    async def warm(self, limit: int) -> int:
+        """Load up to ``limit`` users with one query ahead of their first connect.
+        """
+        async with self._engine.connect() as conn:
+            rows = (await conn.execute(queries.USERS.limit(limit))).all()
+        for row in rows:
+            self._store(row.id, User(id=row.id, name=row.name))
+        return len(rows)
+
+    async def _load_user(self, user_id: str) -> Optional[User]:
+        async with self._engine.connect() as conn:
+            row = (await conn.execute(queries.USER_BY_ID, {"user_id": user_id})).first()
+        return User(id=row.id, name=row.name) if row is not None else None
+
+    async def _load_users(self, user_ids: List[str]) -> Dict[str, User]:
+        async with self._engine.connect() as conn:
+            rows = await conn.execute(queries.USERS_BY_IDS, {"user_ids": list(user_ids)})
+            return {row.id: User(id=row.id, name=row.name) for row in rows}
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
+from aio_pika import ExchangeType
+
+from project.core import PikaClient, WebSocketManager
+from project.schemas import Notification, DecodedNotification
+from project.serializers import serializer
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_EXCHANGE = "ws.presence"
+ROUTE_EXCHANGE = "ws.route"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class ClusterRouter:
+    """Routes notifications to the workers that hold their recipients.
+
+    Every worker keeps a replica of the cluster presence map (user id and topic -> worker
+    ids), fed by the ``ws.presence`` fanout exchange: batched join/leave deltas, full
+    snapshots answering a newcomer's sync request, and heartbeats so that crashed workers
+    expire. Notifications are published on the ``ws.route`` direct exchange with the
+    worker id as routing key, each worker consuming its own exclusive queue, so a message
+    only reaches the workers that can deliver it. Recipients on this worker are delivered
+    directly without a broker round trip.
+    """
+
+    def __init__(self, pika_client: PikaClient, websocket_manager: WebSocketManager,
+                 deliver_local: Callable[[List[Notification]], None], worker_id: Optional[str] = None,
+                 heartbeat_interval: float = 5.0, flush_interval: float = 0.05):
+        self.worker_id = worker_id or default_worker_id()
+        self._pika_client = pika_client
+        self._websocket_manager = websocket_manager
+        self._deliver_local = deliver_local
+        self._heartbeat_interval = heartbeat_interval
+        self._flush_interval = flush_interval
+
+        self._user_workers: Dict[str, Set[str]] = {}
+        self._worker_users: Dict[str, Set[str]] = {}
+        self._topic_workers: Dict[str, Set[str]] = {}
+        self._worker_topics: Dict[str, Set[str]] = {}
+        self._last_seen: Dict[str, float] = {}
+
+        # Pending presence changes of this worker; the last change of a key wins.
+        self._user_changes: Dict[str, bool] = {}
+        self._topic_changes: Dict[str, bool] = {}
+
+        self._channel = None
+        self._task: Optional[asyncio.Task] = None
+        self.routed = 0
+        self.delivered_locally = 0
+
+    # Presence of this worker, called by WebSocketManager
+
+    def user_joined(self, user_id: str):
+        self._user_changes[user_id] = True
+
+    def user_left(self, user_id: str):
+        self._user_changes[user_id] = False
+
+    def topic_changed(self, topic: str, active: bool):
+        self._topic_changes[topic] = active
+
+    # Presence of the other workers
+
+    @property
+    def workers(self) -> Set[str]:
+        return set(self._last_seen)
+
+    def _forget_worker(self, worker: str):
+        for user_id in self._worker_users.pop(worker, ()):
+            self._discard(self._user_workers, user_id, worker)
+        for topic in self._worker_topics.pop(worker, ()):
+            self._discard(self._topic_workers, topic, worker)
+        self._last_seen.pop(worker, None)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, worker: str):
+        workers = index.get(key)
+        if workers is not None:
+            workers.discard(worker)
+            if not workers:
+                del index[key]
+
+    def _apply(self, worker: str, users: Dict[str, bool], topics: Dict[str, bool]):
+        worker_users = self._worker_users.setdefault(worker, set())
+        for user_id, present in users.items():
+            if present:
+                worker_users.add(user_id)
+                self._user_workers.setdefault(user_id, set()).add(worker)
+            else:
+                worker_users.discard(user_id)
+                self._discard(self._user_workers, user_id, worker)
+        worker_topics = self._worker_topics.setdefault(worker, set())
+        for topic, active in topics.items():
+            if active:
+                worker_topics.add(topic)
+                self._topic_workers.setdefault(topic, set()).add(worker)
+            else:
+                worker_topics.discard(topic)
+                self._discard(self._topic_workers, topic, worker)
+
+    async def _on_presence(self, message):
+        event = serializer.loads(message.body)
+        worker = event["worker"]
+        if worker == self.worker_id:
+            return
+        op = event["op"]
+        if op == "bye":
+            self._forget_worker(worker)
+            return
+        self._last_seen[worker] = time.monotonic()
+        if op == "snapshot":
+            self._forget_worker(worker)
+            self._last_seen[worker] = time.monotonic()
+            self._apply(worker, dict.fromkeys(event["users"], True), dict.fromkeys(event["topics"], True))
+        elif op == "delta":
+            self._apply(worker, event["users"], event["topics"])
+        elif op == "sync":
+            await self._publish_presence(self._snapshot())
+
+    def _snapshot(self) -> dict:
+        return {
+            "op": "snapshot",
+            "users": list(self._websocket_manager.users),
+            "topics": list(self._websocket_manager.topics),
+        }
+
+    async def _publish_presence(self, event: dict):
+        event["worker"] = self.worker_id
+        await self._pika_client.publish_batch([event], "", exchange=PRESENCE_EXCHANGE)
+
+    async def _flush(self):
+        if not self._user_changes and not self._topic_changes:
+            return
+        users, self._user_changes = self._user_changes, {}
+        topics, self._topic_changes = self._topic_changes, {}
+        await self._publish_presence({"op": "delta", "users": users, "topics": topics})
+
+    async def _run(self):
+        next_heartbeat = 0.0
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self._flush()
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + self._heartbeat_interval
+                    await self._publish_presence({"op": "heartbeat"})
+                    expired = [worker for worker, seen in self._last_seen.items()
+                               if now - seen > 3 * self._heartbeat_interval]
+                    for worker in expired:
+                        logger.warning("Worker %s expired from the cluster presence map", worker)
+                        self._forget_worker(worker)
+            except Exception:
+                logger.exception("Cluster presence update failed")
+
+    # Routing
+
+    async def _on_route(self, message):
+        batch = serializer.loads(message.body)
+        notifications = [DecodedNotification.parse_obj(item) for item in batch["notifications"]]
+        self.delivered_locally += len(notifications)
+        self._deliver_local(notifications)
+
+    def _plan(self, notification: Notification) -> Dict[str, Notification]:
+        """Split a notification into the part each worker has to deliver."""
+        if notification.broadcast:
+            return {worker: notification for worker in self.workers | {self.worker_id}}
+
+        plan: Dict[str, Dict[str, list]] = {}
+        local = self._websocket_manager.users
+        for user_id in notification.recipients:
+            if user_id in local:
+                plan.setdefault(self.worker_id, {}).setdefault("recipients", []).append(user_id)
+            for worker in self._user_workers.get(user_id, ()):
+                plan.setdefault(worker, {}).setdefault("recipients", []).append(user_id)
+        if notification.topic is not None:
+            workers = set(self._topic_workers.get(notification.topic, ()))
+            if notification.topic in self._websocket_manager.topics:
+                workers.add(self.worker_id)
+            for worker in workers:
+                plan.setdefault(worker, {})["topic"] = notification.topic
+
+        return {
+            worker: Notification.construct(broadcast=False, recipients=part.get("recipients", []),
+                                           topic=part.get("topic"), message=notification.message)
+            for worker, part in plan.items()
+        }
+
+    async def route(self, notifications: List[Notification]):
+        """Deliver notifications across the cluster, one broker message per target worker."""
+        per_worker: Dict[str, List[Notification]] = {}
+        for notification in notifications:
+            for worker, part in self._plan(notification).items():
+                per_worker.setdefault(worker, []).append(part)
+
+        local = per_worker.pop(self.worker_id, None)
+        if local:
+            self._deliver_local(local)
+        await asyncio.gather(*(
+            self._pika_client.publish_batch(
+                [{"notifications": [part.dict() for part in parts]}], worker, exchange=ROUTE_EXCHANGE
+            )
+            for worker, parts in per_worker.items()
+        ))
+        self.routed += sum(len(parts) for parts in per_worker.values())
+
+    # Lifecycle
+
+    async def start(self):
+        if self._task is not None:
+            return
+        connection = await self._pika_client.init_connection()
+        self._channel = await connection.channel()
+        presence = await self._channel.declare_exchange(PRESENCE_EXCHANGE, ExchangeType.FANOUT)
+        route = await self._channel.declare_exchange(ROUTE_EXCHANGE, ExchangeType.DIRECT)
+
+        presence_queue = await self._channel.declare_queue(exclusive=True, auto_delete=True)
+        await presence_queue.bind(presence)
+        await presence_queue.consume(self._on_presence, no_ack=True)
+
+        route_queue = await self._channel.declare_queue(f"{ROUTE_EXCHANGE}.{self.worker_id}",
+                                                        exclusive=True, auto_delete=True)
+        await route_queue.bind(route, routing_key=self.worker_id)
+        await route_queue.consume(self._on_route, no_ack=True)
+
+        self._websocket_manager.presence_listener = self
+        self._user_changes.clear()
+        self._topic_changes.clear()
+        await self._publish_presence(self._snapshot())
+        await self._publish_presence({"op": "sync"})
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._channel is not None:
+            try:
+                await self._publish_presence({"op": "bye"})
+            finally:
+                await self._channel.close()
+                self._channel = None
+        self._websocket_manager.presence_listener = None
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._last_seen),
+            "remote_users": len(self._user_workers),
+            "routed": self.routed,
+            "delivered_locally": self.delivered_locally,
+        }
@@ -1,33 +1,77 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import time
+from typing import Any, Dict
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from project.config import settings
+from project.metrics import Histogram
+
+pool_checkout_wait = Histogram()
+pool_utilization = Histogram(buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0))
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long checkouts wait and how full the pool is."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+            pool_utilization.observe(self.checkedout() / (self.size() + max(self._max_overflow, 0)))
+
 
 engine = create_async_engine(
     settings.DATABASE_URL,
-    connect_args=settings.DATABASE_CONNECT_DICT,
-    echo="debug", pool_pre_ping=True
+    connect_args={
+        **settings.DATABASE_CONNECT_DICT,
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE
+    },
+    echo=settings.DATABASE_ECHO,
+    poolclass=MeteredQueuePool,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+    pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    pool_use_lifo=settings.DATABASE_POOL_USE_LIFO
 )
 Base = declarative_base()
 
 
-async def get_session() -> AsyncSession:
-    async_session = sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-        autoflush=False,
-        autocommit=False
-    )
-    async with async_session() as session:
-        yield session
+def pool_stats() -> Dict[str, Any]:
+    """Current pool occupancy plus checkout wait-time and utilization histograms."""
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkout_wait": pool_checkout_wait.snapshot(),
+        "utilization": pool_utilization.snapshot(),
+    }
+
+
+# No ORM sessions on the request paths: handlers run Core statements from
+# project/polls/queries.py, and each transaction boundary is an explicit
+# ``engine.begin()`` (vote batches, bulk loads) or a read-only ``engine.connect()``.
+
+
+async def connect(warm_connections: int = 1) -> None:
+    """Open ``warm_connections`` pooled connections ahead of the first request.
 
+    The schema is managed by Alembic (``alembic upgrade head``), not created here.
+    """
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
 
-async def connect() -> None:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all, checkfirst=True)
+    await asyncio.gather(*(ping() for _ in range(warm_connections)))
 
 
 async def disconnect() -> None:
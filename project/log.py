@@ -0,0 +1,85 @@
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from rich.logging import RichHandler
+
+# Per-vote events, sampled by VOTE_LOGGER's filter.
+VOTE_LOGGER = "project.votes"
+
+_listener: Optional[QueueListener] = None
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread without formatting them on the event loop.
+
+    The queue lives in this process, so records need not be made picklable: message
+    interpolation, tracebacks and rich rendering all happen in the listener thread. When
+    the queue is full the record is dropped and counted rather than blocking the loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampleFilter(logging.Filter):
+    """Lets through a ``rate`` fraction of records below WARNING; warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+def configure_logging(level: str = "INFO", vote_sample_rate: float = 1.0, queue_size: int = 10_000) -> QueueListener:
+    """Route the ``project`` loggers through a queue to a RichHandler on a background thread.
+
+    Calling it again only updates the level and the vote sampling rate.
+    """
+    global _listener
+    logger = logging.getLogger("project")
+    logger.setLevel(level.upper())
+    vote_logger = logging.getLogger(VOTE_LOGGER)
+    for existing in list(vote_logger.filters):
+        if isinstance(existing, SampleFilter):
+            vote_logger.removeFilter(existing)
+    vote_logger.addFilter(SampleFilter(vote_sample_rate))
+    if _listener is None:
+        log_queue: queue.Queue = queue.Queue(queue_size)
+        logger.addHandler(NonBlockingQueueHandler(log_queue))
+        logger.propagate = False
+        _listener = QueueListener(log_queue, RichHandler(rich_tracebacks=True, show_path=False),
+                                  respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger("project")
+        for handler in [h for h in logger.handlers if isinstance(h, NonBlockingQueueHandler)]:
+            logger.removeHandler(handler)
+        logger.propagate = True
+
+
+def dropped_records() -> int:
+    return sum(h.dropped for h in logging.getLogger("project").handlers if isinstance(h, NonBlockingQueueHandler))
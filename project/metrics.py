@@ -0,0 +1,148 @@
+import bisect
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Sequence, Tuple, Union
+
+# Seconds; spans sub-millisecond socket writes up to multi-second stalls.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is a bisect and two additions."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Meter:
+    """Event counter that also reports a rate over a sliding window of whole seconds."""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self.count = 0
+        self._seconds: Deque[List[int]] = deque()
+
+    def mark(self, n: int = 1):
+        self.count += n
+        now = int(time.monotonic())
+        if self._seconds and self._seconds[-1][0] == now:
+            self._seconds[-1][1] += n
+        else:
+            self._seconds.append([now, n])
+            while self._seconds[0][0] <= now - self.window:
+                self._seconds.popleft()
+
+    def rate(self) -> float:
+        """Events per second over the window."""
+        now = int(time.monotonic())
+        while self._seconds and self._seconds[0][0] <= now - self.window:
+            self._seconds.popleft()
+        if not self._seconds:
+            return 0.0
+        span = max(1, now - self._seconds[0][0] + 1)
+        return sum(n for _, n in self._seconds) / span
+
+
+class Span:
+    """Times a block into a histogram: ``with Span(histogram): ...``"""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+Source = Union[Histogram, Meter, Callable[[], float]]
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape_help(text: str) -> str:
+    """Backslashes and line breaks escaped, as HELP lines require."""
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+class Registry:
+    """Named metrics rendered in the Prometheus text exposition format.
+
+    Nothing is recorded through the registry: it only reads the histograms, meters and
+    plain counters the components already keep, when ``/metrics`` is scraped.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: Dict[str, Tuple[str, str, Source]] = {}
+
+    def register(self, name: str, source: Source, help: str = "", kind: str = "gauge"):
+        """Expose ``source``; a callable is read as a ``kind`` ("gauge" or "counter") value.
+        """
+        self._metrics[self.prefix + name] = (kind, help, source)
+
+    def histogram(self, name: str, histogram: Histogram, help: str = ""):
+        self.register(name, histogram, help, kind="histogram")
+
+    def counter(self, name: str, source: Union[Meter, Callable[[], float]], help: str = ""):
+        self.register(name, source, help, kind="counter")
+
+    def gauge(self, name: str, source: Callable[[], float], help: str = ""):
+        self.register(name, source, help, kind="gauge")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, (kind, help, source) in self._metrics.items():
+            if help:
+                lines.append(f"# HELP {name} {_escape_help(help)}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(source, Histogram):
+                cumulative = 0
+                for bound, count in zip(source.buckets + (float("inf"),), source.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {cumulative}')
+                lines.append(f"{name}_sum {_number(source.sum)}")
+                lines.append(f"{name}_count {source.count}")
+            elif isinstance(source, Meter):
+                lines.append(f"{name} {source.count}")
+            else:
+                lines.append(f"{name} {_number(source())}")
+        lines.append("")
+        return "\n".join(lines)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from html import escape
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+from project.polls import queries
+
+HEAD = """
+            <!DOCTYPE html>
+        	<html>
+        	    <head>
+        	        <title>Polling Websocket App</title>
+        	        <script type="text/javascript">
+        	            var ws = null;
+        	            var id = null;
+                        function login(select_object) {
+                            var id = select_object.value;
+                            const ws_url = '/ws_vote/' + id;
+                            ws = new WebSocket((location.protocol === 'https:' ? 'wss' : 'ws') + '://app.rezayogaswara.dev' + ws_url);
+                            if (id !== undefined) {
+                                ws.onopen = function() {
+                                    var poll = document.getElementById("poll_id");
+                                    if (poll !== null) {
+                                        ws.send(JSON.stringify({ "type": "subscribe", "poll_id": poll.value }));
+                                    }
+                                };
+                                ws.onmessage = function(event) {
+                                    console.log(event.data);
+                                    var messages = document.getElementById('messages');
+                                    var data = document.createElement('li');
+                                    var content = document.createTextNode(event.data);
+                                    data.appendChild(content);
+                                    messages.appendChild(data);
+                                    
+                                    m = JSON.parse(event.data);
+                                    if (m.type === "voter_join") {
+                                        document.getElementById("btn-vote").disabled = false;
+                                        document.getElementById("select-poll").disabled = false;
+                                    }
+                                    
+                                    document.getElementById("btn-vote").onclick = function() {
+                                        vote();
+                                    };                           
+                                };
+                                
+                                select_object.disabled = true;
+                            }
+                        }
+
+                        function vote() {
+                            document.getElementById("btn-vote").disabled = true;
+                            document.getElementById("select-poll").disabled = true;
+                            ws.send(JSON.stringify({ "type": "vote", "poll_id": document.getElementById("poll_id").value, "option_id": document.getElementById("select-poll").value }));
+                        }
+        	        </script>
+        	    </head>
+        	    <body>"""
+
+USERS_OPEN = """
+                    <h3 id="h1-title">Users</h3>
+                    <select user_id="select_id" style="width:30%" onchange="login(this)">
+                    <option selected="selected" value="-">Select</option>
+                    """
+
+SELECT_CLOSE = """
+                			</select>
+                			"""
+
+FOOTER = """<hr /><button id="btn-vote" disabled>Vote!</button><br />
+                	        <div id="messages"></div>
+                	    </body>
+                	</html>
+                    """
+
+
+def render_ws_client(users: Sequence[Tuple[str, str]], options: Sequence[Tuple[str, str, str, str]]) -> str:
+    """Render the voting page in a single join over its parts.
+
+    ``users`` are ``(id, name)`` rows, ``options`` are ``(poll_id, question, option_id,
+    option)`` rows.
+    """
+    parts: List[str] = [HEAD]
+    if users:
+        parts.append(USERS_OPEN)
+        parts.extend(f'<option value="{escape(user_id)}">{escape(name)}</option>' for user_id, name in users)
+    parts.append(SELECT_CLOSE)
+    parts.append("<hr />")
+    if options:
+        poll_id, question = options[0][0], options[0][1]
+        parts.append(f'<h3 id="h1-title">{escape(question)}</h3>')
+        parts.append(f'<input type="hidden" id="poll_id" value="{escape(poll_id)}">')
+        parts.append('<select id="select-poll" disabled style="width:100%">')
+        parts.extend(f'<option value="{escape(option_id)}">{escape(option)}</option>'
+                     for _, _, option_id, option in options)
+        parts.append("</select>")
+    parts.append(FOOTER)
+    return "".join(parts)
+
+
+class RenderedPage:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        self.built_at = time.time()
+        self.last_modified = formatdate(self.built_at, usegmt=True)
+
+
+class WsClientPage:
+    """The rendered ``/ws_client`` page, rebuilt only after users, polls or options change.
+
+    Writers that change them, such as the bulk loader, call :meth:`invalidate`; ``max_age``
+    bounds how long any other change, including those of other processes, can go unnoticed.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_age: float = 60.0):
+        self._engine = engine
+        self._max_age = max_age
+        self._page: Optional[RenderedPage] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.builds = 0
+
+    def invalidate(self):
+        self._page = None
+
+    async def _load(self):
+        async with self._engine.connect() as conn:
+            users = (await conn.execute(queries.USERS)).all()
+            options = (await conn.execute(queries.POLL_OPTIONS)).all()
+        return users, options
+
+    def _fresh(self, page: Optional[RenderedPage]) -> bool:
+        return page is not None and (not self._max_age or time.time() - page.built_at < self._max_age)
+
+    async def get(self) -> RenderedPage:
+        page = self._page
+        if self._fresh(page):
+            return page
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._fresh(self._page):
+                users, options = await self._load()
+                self._page = RenderedPage(render_ws_client(users, options).encode())
+                self.builds += 1
+            return self._page
+
+    async def response(self, request: Request) -> Response:
+        """Serve the page, answering conditional requests with 304 Not Modified."""
+        page = await self.get()
+        headers = {"ETag": page.etag, "Last-Modified": page.last_modified, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if page.etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+                return Response(status_code=304, headers=headers)
+        elif "if-modified-since" in request.headers:
+            try:
+                since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and int(page.built_at) <= since:
+                return Response(status_code=304, headers=headers)
+        return Response(page.body, media_type="text/html", headers=headers)
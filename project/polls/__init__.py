@@ -5,3 +5,5 @@ polls_router = APIRouter(
 )
 
 from . import models  # noqa
+from . import export  # noqa
+from . import bulk  # noqa
@@ -0,0 +1,267 @@
+"""Bulk creation of polls with their options, and of users, from a streamed upload.
+
+The request body is parsed as it arrives (NDJSON, or CSV for users, one record per line)
+and written with asyncpg ``COPY`` in chunks of ``BULK_CHUNK_SIZE`` rows, each chunk in
+its own transaction. The next chunk is parsed while the previous one is being copied.
+Ids are generated here (uuid4) unless the record carries one, since COPY bypasses the
+``uuid_generate_v4()`` column defaults.
+
+A chunk that fails leaves the chunks before it committed; the error response says how
+many rows were created, so a client supplying its own ids can resume after them.
+"""
+import asyncio
+import codecs
+import csv
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from asyncpg import IntegrityConstraintViolationError
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.config import settings
+from project.database import engine
+from project.polls import polls_router, queries
+from project.serializers import serializer
+
+logger = logging.getLogger(__name__)
+
+POLL_COLUMNS = ("id", "question")
+OPTION_COLUMNS = ("id", "poll_id", "option")
+USER_COLUMNS = ("id", "name")
+
+# (table, columns, rows) in the order they are copied, parents first
+Batch = List[Tuple[str, Sequence[str], List[tuple]]]
+
+
+class BulkInputError(ValueError):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    """(line number, object) for every non-empty line of a streamed NDJSON body."""
+    line_number = 0
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, _parse_json(line_number, line)
+    if tail.strip():
+        yield line_number + 1, _parse_json(line_number + 1, tail)
+
+
+def _parse_json(line_number: int, line: bytes) -> dict:
+    try:
+        record = serializer.loads(line)
+    except ValueError as e:
+        raise BulkInputError(line_number, f"invalid JSON: {e}") from None
+    if not isinstance(record, dict):
+        raise BulkInputError(line_number, "expected a JSON object")
+    return record
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    """(line number, row) for a streamed CSV body whose first line names the columns."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header = None
+    line_number = 0
+    tail = ""
+
+    def rows(lines: List[str]):
+        nonlocal header, line_number
+        for values in csv.reader(lines):
+            line_number += 1
+            if header is None:
+                header = [name.strip() for name in values]
+            elif values:
+                yield line_number, dict(zip(header, values))
+
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for record in rows(lines):
+            yield record
+    for record in rows([tail + decoder.decode(b"", final=True)]):
+        yield record
+
+
+def _text(line_number: int, record: dict, field: str, required: bool = True):
+    value = record.get(field)
+    if value is None or value == "":
+        if required:
+            raise BulkInputError(line_number, f"missing {field!r}")
+        return None
+    if not isinstance(value, str):
+        raise BulkInputError(line_number, f"{field!r} must be a string")
+    # Ids are String(128) columns
+    if field == "id" and len(value) > 128:
+        raise BulkInputError(line_number, "'id' is longer than 128 characters")
+    return value
+
+
+def poll_rows(line_number: int, record: dict) -> Tuple[tuple, List[tuple]]:
+    """A poll ``{"question": ..., "options": [...], "id": optional}``; options are strings
+    or ``{"option": ..., "id": optional}`` objects.
+    """
+    poll_id = _text(line_number, record, "id", required=False) or str(uuid.uuid4())
+    options = record.get("options")
+    if not isinstance(options, list) or not options:
+        raise BulkInputError(line_number, "'options' must be a non-empty list")
+    option_rows = []
+    for option in options:
+        if isinstance(option, str):
+            option = {"option": option}
+        elif not isinstance(option, dict):
+            raise BulkInputError(line_number, "options must be strings or objects")
+        option_id = _text(line_number, option, "id", required=False) or str(uuid.uuid4())
+        option_rows.append((option_id, poll_id, _text(line_number, option, "option")))
+    return (poll_id, _text(line_number, record, "question")), option_rows
+
+
+def user_row(line_number: int, record: dict) -> tuple:
+    """A user ``{"name": ..., "id": optional}``."""
+    return _text(line_number, record, "id", required=False) or str(uuid.uuid4()), _text(line_number, record, "name")
+
+
+async def poll_batches(records: AsyncIterator[Tuple[int, dict]], chunk_size: int) -> AsyncIterator[Batch]:
+    polls: List[tuple] = []
+    options: List[tuple] = []
+    async for line_number, record in records:
+        poll, poll_options = poll_rows(line_number, record)
+        polls.append(poll)
+        options.extend(poll_options)
+        if len(polls) + len(options) >= chunk_size:
+            yield [("polls", POLL_COLUMNS, polls), ("options", OPTION_COLUMNS, options)]
+            polls, options = [], []
+    if polls:
+        yield [("polls", POLL_COLUMNS, polls), ("options", OPTION_COLUMNS, options)]
+
+
+async def user_batches(records: AsyncIterator[Tuple[int, dict]], chunk_size: int) -> AsyncIterator[Batch]:
+    users: List[tuple] = []
+    async for line_number, record in records:
+        users.append(user_row(line_number, record))
+        if len(users) >= chunk_size:
+            yield [("users", USER_COLUMNS, users)]
+            users = []
+    if users:
+        yield [("users", USER_COLUMNS, users)]
+
+
+class CopyLoader:
+    """Copies batches into Postgres, one transaction per batch, keeping one batch in flight.
+    """
+
+    def __init__(self, engine: AsyncEngine, on_copied: Optional[Callable[[Batch], None]] = None):
+        self._engine = engine
+        # Called with every batch once it is committed
+        self.on_copied = on_copied
+        self.created: Dict[str, int] = {}
+        self.chunks = 0
+        self.seconds = 0.0
+
+    async def _copy(self, batch: Batch):
+        async with self._engine.begin() as conn:
+            # The asyncpg adapter opens its transaction on the first statement; COPY has to run
+            # inside it so that the commit on leaving engine.begin() covers the rows. A
+            # transaction of our own on the driver connection would only be a savepoint
+            # when one is already open (e.g. after pool pre-ping) and be rolled back on release.
+            await conn.execute(queries.BULK_BEGIN)
+            raw = await conn.get_raw_connection()
+            # COPY is not exposed through the DBAPI adapter, use the asyncpg connection
+            driver = raw.driver_connection
+            if not driver.is_in_transaction():
+                raise RuntimeError("COPY would run outside the SQLAlchemy transaction")
+            for table, columns, rows in batch:
+                if rows:
+                    await driver.copy_records_to_table(table, records=rows, columns=columns)
+        for table, _, rows in batch:
+            self.created[table] = self.created.get(table, 0) + len(rows)
+        self.chunks += 1
+        if self.on_copied is not None:
+            self.on_copied(batch)
+
+    async def load(self, batches: AsyncIterator[Batch]) -> Dict[str, int]:
+        start = time.perf_counter()
+        pending = None
+        try:
+            async for batch in batches:
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(self._copy(batch))
+        finally:
+            if pending is not None:
+                await pending
+            self.seconds = time.perf_counter() - start
+        return self.created
+
+    @property
+    def rows(self) -> int:
+        return sum(self.created.values())
+
+    def report(self) -> dict:
+        return {
+            "created": dict(self.created),
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows / self.seconds) if self.seconds else 0,
+        }
+
+
+def _invalidate_caches(app) -> Callable[[Batch], None]:
+    """Invalidation of the app's caches after a committed batch.
+
+    The ws_client page lists users and polls, and the user cache may hold "no such user"
+    answers for ids that exist now.
+    """
+    page = getattr(app, "ws_client_page", None)
+    user_cache = getattr(app, "user_cache", None)
+
+    def invalidate(batch: Batch):
+        if page is not None:
+            page.invalidate()
+        if user_cache is not None:
+            for table, _, rows in batch:
+                if table == "users":
+                    for row in rows:
+                        user_cache.invalidate(row[0])
+
+    return invalidate
+
+
+async def _load(request: Request, batches: AsyncIterator[Batch]) -> dict:
+    loader = CopyLoader(engine, on_copied=_invalidate_caches(request.app))
+    try:
+        await loader.load(batches)
+    except BulkInputError as e:
+        raise HTTPException(status_code=422, detail={"error": str(e), **loader.report()})
+    except IntegrityConstraintViolationError as e:
+        raise HTTPException(status_code=409, detail={"error": str(e), **loader.report()})
+    report = loader.report()
+    logger.info("Bulk load: %s rows in %.2fs (%s rows/s) %s", report["rows"], report["seconds"],
+                report["rows_per_sec"], report["created"])
+    return report
+
+
+@polls_router.post("/bulk", status_code=201)
+async def bulk_create_polls(request: Request):
+    """Create polls with their options from an NDJSON body, one poll per line."""
+    return await _load(request, poll_batches(ndjson_records(request.stream()), settings.BULK_CHUNK_SIZE))
+
+
+@polls_router.post("/users/bulk", status_code=201)
+async def bulk_create_users(request: Request):
+    """Create users from an NDJSON body, or a CSV body (``Content-Type: text/csv``) with a
+    ``name`` and optionally an ``id`` column.
+    """
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    records = csv_records(request.stream()) if is_csv else ndjson_records(request.stream())
+    return await _load(request, user_batches(records, settings.BULK_CHUNK_SIZE))
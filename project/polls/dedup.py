@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from aio_pika import ExchangeType
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.cache import SingleFlight
+from project.polls import queries
+from project.serializers import serializer
+
+logger = logging.getLogger(__name__)
+
+VOTED_EXCHANGE = "votes.voted"
+
+
+class VotedSet:
+    """Who voted on which poll, checked before a vote costs a database round trip.
+
+    The voters of a poll are loaded from ``votes`` with one query when the first vote for
+    it reaches this worker, then kept current by :meth:`claim`. Postgres stays
+    authoritative: a duplicate this worker does not know about (a vote cast through
+    another worker and not replicated) is still rejected by ``unique_vote``.
+
+    Memory is bounded by the voters held in total, ``max_entries``, evicting the least
+    recently used polls, and by ``max_polls``. A poll with more than ``max_poll_voters``
+    voters is not held at all: its votes go to the database, which rejects the duplicates.
+
+    Results of votes carrying a client idempotency key are remembered per poll and user
+    for ``idempotency_ttl`` seconds, so a retried message gets the original outcome instead
+    of an "already voted" error.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_polls: int = 10_000, max_entries: int = 1_000_000,
+                 max_poll_voters: int = 100_000, idempotency_ttl: float = 600.0,
+                 max_idempotency_keys: int = 100_000):
+        self._engine = engine
+        self._max_polls = max_polls
+        self._max_entries = max_entries
+        self._max_poll_voters = min(max_poll_voters, max_entries)
+        # Voters by poll in LRU order; None for a poll with too many voters to hold
+        self._voters: "OrderedDict[str, Optional[Set[str]]]" = OrderedDict()
+        self._loading = SingleFlight()
+        self._entries = 0
+        self._idempotency_ttl = idempotency_ttl
+        self._max_idempotency_keys = max_idempotency_keys
+        self._results: "OrderedDict[Tuple[str, str, str], Tuple[float, asyncio.Future]]" = OrderedDict()
+        # Told about every vote known to be in the database, see VotedSetReplicator.
+        self.listener = None
+        self.rejected = 0
+        self.replayed = 0
+        self.loads = 0
+        self.evicted = 0
+
+    async def _load_voters(self, poll_id: str) -> Optional[Set[str]]:
+        async with self._engine.connect() as conn:
+            result = await conn.execute(queries.VOTERS, {"poll_id": poll_id, "limit": self._max_poll_voters + 1})
+            voters = set(result.scalars())
+        return voters if len(voters) <= self._max_poll_voters else None
+
+    async def _get(self, poll_id: str) -> Optional[Set[str]]:
+        if poll_id in self._voters:
+            self._voters.move_to_end(poll_id)
+            return self._voters[poll_id]
+        return await self._loading.run(poll_id, self._load)
+
+    async def _load(self, poll_id: str) -> Optional[Set[str]]:
+        self.loads += 1
+        voters = await self._load_voters(poll_id)
+        self._voters[poll_id] = voters
+        self._entries += len(voters or ())
+        self._evict()
+        return voters
+
+    def _evict(self):
+        """Drop least recently used polls until both bounds hold; the newest one stays."""
+        while len(self._voters) > 1 and (len(self._voters) > self._max_polls or self._entries > self._max_entries):
+            _, voters = self._voters.popitem(last=False)
+            self._entries -= len(voters or ())
+            self.evicted += 1
+
+    def _add(self, poll_id: str, voters: Set[str], user_id: str):
+        voters.add(user_id)
+        self._entries += 1
+        if len(voters) > self._max_poll_voters:
+            # Grown too large to hold, leave it to the database from now on
+            self._voters[poll_id] = None
+            self._entries -= len(voters)
+        else:
+            self._evict()
+
+    async def claim(self, poll_id: str, user_id: str) -> bool:
+        """Record a vote about to be inserted; False when the user is known to have voted.
+        """
+        voters = await self._get(poll_id)
+        if voters is None:
+            return True
+        if user_id in voters:
+            self.rejected += 1
+            return False
+        self._add(poll_id, voters, user_id)
+        return True
+
+    def confirm(self, poll_id: str, user_id: str):
+        """The claimed vote is in the database, stored now or by an earlier insert."""
+        if self.listener is not None:
+            self.listener.voted(poll_id, user_id)
+
+    def release(self, poll_id: str, user_id: str):
+        """Undo a claim whose insert failed."""
+        voters = self._voters.get(poll_id)
+        if voters is not None and user_id in voters:
+            voters.discard(user_id)
+            self._entries -= 1
+
+    def add(self, poll_id: str, user_id: str):
+        """Record a vote made elsewhere; polls not loaded here will see it when warmed."""
+        voters = self._voters.get(poll_id)
+        if voters is not None and user_id not in voters:
+            self._add(poll_id, voters, user_id)
+
+    def replay(self, poll_id: str, user_id: str, key: str) -> Optional[asyncio.Future]:
+        """Outcome of an earlier vote on the poll with the same idempotency key, if still
+        remembered. The same key sent with a vote on another poll is a different vote.
+        """
+        entry = self._results.get((poll_id, user_id, key))
+        if entry is None:
+            return None
+        expires_at, future = entry
+        if expires_at < time.monotonic():
+            del self._results[(poll_id, user_id, key)]
+            return None
+        self.replayed += 1
+        return future
+
+    def remember(self, poll_id: str, user_id: str, key: str, future: asyncio.Future):
+        self._results[(poll_id, user_id, key)] = (time.monotonic() + self._idempotency_ttl, future)
+        self._results.move_to_end((poll_id, user_id, key))
+        while len(self._results) > self._max_idempotency_keys:
+            self._results.popitem(last=False)
+
+    def forget(self, poll_id: str, user_id: str, key: str):
+        self._results.pop((poll_id, user_id, key), None)
+
+    def invalidate(self, poll_id: Optional[str] = None):
+        if poll_id is None:
+            self._voters.clear()
+            self._entries = 0
+        else:
+            self._entries -= len(self._voters.pop(poll_id, None) or ())
+
+    @property
+    def saved_round_trips(self) -> int:
+        return self.rejected + self.replayed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "polls": len(self._voters),
+            "untracked_polls": sum(1 for voters in self._voters.values() if voters is None),
+            "entries": self._entries,
+            "idempotency_keys": len(self._results),
+            "rejected": self.rejected,
+            "replayed": self.replayed,
+            "saved_round_trips": self.saved_round_trips,
+            "loads": self.loads,
+            "evicted": self.evicted,
+        }
+
+
+class VotedSetReplicator:
+    """Shares confirmed votes between workers over the ``votes.voted`` fanout exchange.
+
+    Votes are batched for ``flush_interval`` seconds. Other workers add them to the polls
+    they have loaded, so a duplicate sent to another worker is rejected there in memory
+    too. Replication is best effort; the ``unique_vote`` constraint still backs it.
+    """
+
+    def __init__(self, pika_client, voted_set: VotedSet, flush_interval: float = 0.05):
+        self._pika_client = pika_client
+        self._voted_set = voted_set
+        self._flush_interval = flush_interval
+        self._pending: List[Tuple[str, str]] = []
+        self._channel = None
+        self._task: Optional[asyncio.Task] = None
+        self._origin = uuid.uuid4().hex
+        self.replicated = 0
+
+    def voted(self, poll_id: str, user_id: str):
+        self._pending.append((poll_id, user_id))
+
+    async def _on_voted(self, message):
+        event = serializer.loads(message.body)
+        if event["origin"] == self._origin:
+            return
+        for poll_id, user_id in event["votes"]:
+            self._voted_set.add(poll_id, user_id)
+        self.replicated += len(event["votes"])
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        votes, self._pending = self._pending, []
+        await self._pika_client.publish_batch([{"origin": self._origin, "votes": votes}], "",
+                                              exchange=VOTED_EXCHANGE)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Voted set replication failed")
+
+    async def start(self):
+        if self._task is not None:
+            return
+        connection = await self._pika_client.init_connection()
+        self._channel = await connection.channel()
+        exchange = await self._channel.declare_exchange(VOTED_EXCHANGE, ExchangeType.FANOUT)
+        queue = await self._channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange)
+        await queue.consume(self._on_voted, no_ack=True)
+        self._voted_set.listener = self
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        self._voted_set.listener = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._channel is not None:
+            await self._channel.close()
+            self._channel = None
@@ -0,0 +1,92 @@
+"""Streaming export of a poll's tally and votes as NDJSON or CSV.
+
+Votes are read in keyset pages ordered by ``user_id``, each page through a server-side
+cursor (``AsyncConnection.stream``) on a pooled connection that is returned before the
+next page starts. Rows are fetched, encoded and sent ``EXPORT_CHUNK_SIZE`` at a time, so
+memory stays bounded by one chunk whatever the size of the poll, the event loop is free
+between chunks, and no connection or snapshot is held for the whole export.
+"""
+import csv
+import io
+from typing import AsyncIterator, Iterable, List, Sequence
+
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.config import settings
+from project.database import engine
+from project.polls import polls_router, queries
+from project.serializers import serializer
+
+VOTE_COLUMNS = ("id", "user_id", "option_id", "created_at")
+TALLY_COLUMNS = ("poll_id", "question", "option_id", "option", "total")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def vote_chunks(engine: AsyncEngine, poll_id: str, page_size: int,
+                      chunk_size: int) -> AsyncIterator[List[tuple]]:
+    """Votes of a poll in ``user_id`` order, ``chunk_size`` rows at a time."""
+    after = ""
+    while True:
+        fetched = 0
+        async with engine.connect() as conn:
+            result = await conn.stream(queries.EXPORT_VOTES, {"poll_id": poll_id, "after": after, "limit": page_size})
+            async for rows in result.partitions(chunk_size):
+                fetched += len(rows)
+                after = rows[-1].user_id
+                yield [(vote_id, user_id, option_id, created_at.isoformat())
+                       for vote_id, user_id, option_id, created_at in rows]
+        if fetched < page_size:
+            return
+
+
+def encode_ndjson(columns: Sequence[str], rows: Iterable[tuple]) -> bytes:
+    return b"".join(serializer.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def encode_csv(rows: Iterable[tuple]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def encode(columns: Sequence[str], chunks: AsyncIterator[List[tuple]], fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        yield encode_csv([columns])
+        async for rows in chunks:
+            yield encode_csv(rows)
+    else:
+        async for rows in chunks:
+            yield encode_ndjson(columns, rows)
+
+
+def export_response(columns: Sequence[str], chunks: AsyncIterator[List[tuple]], fmt: str,
+                    filename: str) -> StreamingResponse:
+    return StreamingResponse(encode(columns, chunks, fmt), media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'})
+
+
+async def _single_chunk(rows: List[tuple]) -> AsyncIterator[List[tuple]]:
+    yield rows
+
+
+@polls_router.get("/{poll_id}/tally")
+async def export_tally(poll_id: str, format: str = Query("ndjson", regex="^(ndjson|csv)$")):
+    """Vote totals of every option of the poll."""
+    async with engine.connect() as conn:
+        rows = [tuple(row) for row in await conn.execute(queries.TALLY, {"poll_ids": [poll_id]})]
+    if not rows:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    return export_response(TALLY_COLUMNS, _single_chunk(rows), format, f"poll-{poll_id}-tally")
+
+
+@polls_router.get("/{poll_id}/votes")
+async def export_votes(poll_id: str, format: str = Query("ndjson", regex="^(ndjson|csv)$")):
+    """Every vote of the poll, streamed."""
+    async with engine.connect() as conn:
+        if (await conn.execute(queries.POLL_EXISTS, {"poll_id": poll_id})).first() is None:
+            raise HTTPException(status_code=404, detail="Poll not found")
+    chunks = vote_chunks(engine, poll_id, settings.EXPORT_PAGE_SIZE, settings.EXPORT_CHUNK_SIZE)
+    return export_response(VOTE_COLUMNS, chunks, format, f"poll-{poll_id}-votes")
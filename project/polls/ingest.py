@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.metrics import Histogram, Span
+from project.polls import queries
+from project.polls.dedup import VotedSet
+
+logger = logging.getLogger(__name__)
+
+PendingVote = Tuple[dict, asyncio.Future]
+
+# Length of the String(128) id columns of votes
+MAX_ID_LENGTH = 128
+
+
+class InvalidVote(ValueError):
+    """A vote that can never be inserted, rejected before it joins a batch."""
+
+
+class VoteIngestor:
+    """Group commit for votes coming from every WebSocket connection.
+
+    Votes are collected into micro-batches that are flushed when ``max_batch_size`` votes
+    are pending or ``max_latency`` seconds after the first one arrived, whichever comes
+    first. Each batch is a single ``INSERT ... SELECT FROM unnest(...) ON CONFLICT ON
+    CONSTRAINT unique_vote DO NOTHING`` in one transaction, and every submitter learns
+    whether its own vote was stored or was a duplicate. When a batch fails for anything
+    but a lost connection, it is split in halves and retried, so a single bad row only
+    fails its own submitter.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_batch_size: int = 500, max_latency: float = 0.005,
+                 workers: int = 2, voted: Optional[VotedSet] = None,
+                 on_counted: Optional[Callable[[str, str, int], None]] = None):
+        self._engine = engine
+        self.voted = voted
+        # Called after each committed batch with (poll_id, option_id, total) for every option
+        # that got votes, total being its absolute count in poll_option_counts
+        self.on_counted = on_counted
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._workers = workers
+        self._queue: "asyncio.Queue[PendingVote]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self.batches = 0
+        self.votes = 0
+        self.duplicates = 0
+        self.splits = 0
+        # Time a vote waits for its batch to commit, and time of the batch INSERT itself
+        self.commit_latency = Histogram()
+        self.flush_latency = Histogram()
+
+    async def submit(self, poll_id: str, option_id: str, user_id: str,
+                     idempotency_key: Optional[str] = None) -> bool:
+        """Queue a vote and wait for its batch to commit.
+
+        Returns True when the vote was stored and False when the user already voted on
+        the poll. Database errors are raised to the caller. With a ``voted`` set, known
+        duplicates are answered without a database round trip and a repeated
+        ``idempotency_key`` gets the outcome of the first submission. Raises
+        :class:`InvalidVote` for ids that are not strings of at most 128 characters.
+        """
+        self._validate(poll_id, option_id, user_id, idempotency_key)
+        voted = self.voted
+        future = asyncio.get_event_loop().create_future()
+        if voted is not None:
+            known = await self._check(poll_id, user_id, idempotency_key, future)
+            if known is not None:
+                return known
+
+        self._enqueue(poll_id, option_id, user_id, future)
+        try:
+            with Span(self.commit_latency):
+                stored = await asyncio.shield(future)
+        except Exception:
+            if voted is not None:
+                voted.release(poll_id, user_id)
+                self._forget(poll_id, user_id, idempotency_key)
+            raise
+        if voted is not None:
+            voted.confirm(poll_id, user_id)
+        return stored
+
+    @staticmethod
+    def _validate(poll_id: str, option_id: str, user_id: str, idempotency_key: Optional[str]):
+        for name, value in (("poll_id", poll_id), ("option_id", option_id), ("user_id", user_id)):
+            if not isinstance(value, str) or not value or len(value) > MAX_ID_LENGTH:
+                raise InvalidVote(f"{name} must be a string of 1 to {MAX_ID_LENGTH} characters")
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            raise InvalidVote("idempotency_key must be a string")
+
+    async def _check(self, poll_id: str, user_id: str, idempotency_key: Optional[str],
+                     future: asyncio.Future) -> Optional[bool]:
+        """Outcome known without the database: a replayed idempotency key or a known
+        duplicate. None when the vote has been claimed and has to be inserted.
+        """
+        voted = self.voted
+        if idempotency_key is not None:
+            previous = voted.replay(poll_id, user_id, idempotency_key)
+            if previous is not None:
+                return await asyncio.shield(previous)
+            voted.remember(poll_id, user_id, idempotency_key, future)
+        try:
+            claimed = await voted.claim(poll_id, user_id)
+        except BaseException:
+            self._forget(poll_id, user_id, idempotency_key)
+            raise
+        if not claimed:
+            future.set_result(False)
+            return False
+        return None
+
+    def _enqueue(self, poll_id: str, option_id: str, user_id: str, future: asyncio.Future):
+        if not self._tasks:
+            self.start()
+        row = {"id": str(uuid.uuid4()), "poll_id": poll_id, "option_id": option_id, "user_id": user_id}
+        self._queue.put_nowait((row, future))
+
+    def _forget(self, poll_id: str, user_id: str, idempotency_key: Optional[str]):
+        if idempotency_key is not None:
+            self.voted.forget(poll_id, user_id, idempotency_key)
+
+    async def _collect(self) -> List[PendingVote]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: List[PendingVote]):
+        rows = [row for row, _ in batch]
+        params = {
+            "ids": [row["id"] for row in rows],
+            "poll_ids": [row["poll_id"] for row in rows],
+            "option_ids": [row["option_id"] for row in rows],
+            "user_ids": [row["user_id"] for row in rows],
+        }
+        try:
+            with Span(self.flush_latency):
+                async with self._engine.begin() as conn:
+                    result = await conn.execute(queries.VOTE_INSERT, params)
+                    inserted = {vote_id: total for vote_id, total in result}
+        except Exception as e:
+            if len(batch) > 1 and isinstance(e, DBAPIError) and not e.connection_invalidated:
+                # The transaction was rolled back as a whole; find the offending row(s)
+                self.splits += 1
+                middle = len(batch) // 2
+                await self._flush(batch[:middle])
+                await self._flush(batch[middle:])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._settle(batch, inserted)
+
+    def _settle(self, batch: List[PendingVote], inserted: Dict[str, int]):
+        """Report the committed totals and tell every submitter whether its vote was stored."""
+        self.batches += 1
+        self.votes += len(batch)
+        totals = {}
+        for row, _ in batch:
+            total = inserted.get(row["id"])
+            if total is None:
+                self.duplicates += 1
+            else:
+                totals[row["poll_id"], row["option_id"]] = total
+        if self.on_counted is not None:
+            for (poll_id, option_id), total in totals.items():
+                self.on_counted(poll_id, option_id, total)
+        for row, future in batch:
+            if not future.done():
+                future.set_result(row["id"] in inserted)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._flush(batch)
+            except Exception:
+                logger.exception("Vote batch flush failed")
+
+    def start(self):
+        if not self._tasks:
+            loop = asyncio.get_event_loop()
+            self._tasks = [loop.create_task(self._run()) for _ in range(self._workers)]
+
+    async def stop(self):
+        """Flush what is already queued, then stop the workers."""
+        while not self._queue.empty():
+            await self._flush(await self._collect())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "votes": self.votes,
+            "duplicates": self.duplicates,
+            "splits": self.splits,
+            "pending": self._queue.qsize(),
+            "avg_batch_size": self.votes / self.batches if self.batches else 0.0,
+            "saved_round_trips": self.voted.saved_round_trips if self.voted is not None else 0,
+        }
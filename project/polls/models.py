@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, UniqueConstraint, ForeignKey, DateTime, func, text
+from sqlalchemy import Column, Integer, BigInteger, String, UniqueConstraint, ForeignKey, DateTime, func, text
 
 from project.database import Base
 
@@ -44,6 +44,20 @@ class Vote(Base):
         self.user_id = user_id
 
 
+class PollOptionCount(Base):
+    """Vote total of an option, incremented in the same transaction as the vote insert."""
+    __tablename__ = "poll_option_counts"
+
+    poll_id = Column(String(128), primary_key=True)
+    option_id = Column(String(128), primary_key=True)
+    total = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    def __init__(self, poll_id, option_id, total=0):
+        self.poll_id = poll_id
+        self.option_id = option_id
+        self.total = total
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from project.metrics import Histogram, Span
+from project.polls.tally import PollTally, TallyCache
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+
+
+class PollPushState:
+    """What watchers of a poll were last sent, as the baseline of the next delta."""
+    __slots__ = ("seq", "options", "totals")
+
+    def __init__(self, tally: PollTally, seq: int = 0):
+        self.seq = seq
+        self.options = dict(tally.options)
+        self.totals = dict(tally.totals)
+
+
+class TallyPushScheduler:
+    """Coalesces live tally updates per poll and pushes them at a fixed tick rate.
+
+    Votes only mark their poll dirty. Every ``interval`` seconds the latest tally of each
+    dirty poll is published once, in a single batch, so outbound volume is bounded by
+    polls x tick rate instead of by vote rate. Polls whose totals did not change since the
+    last push are skipped. A poll's baseline only advances once its push was published; if
+    publishing fails the polls are marked dirty again and retried on the next tick.
+
+    Each push goes out twice: the full ``VoteNotification`` for legacy watchers, and a
+    versioned frame for watchers of :func:`~project.core.tally_topic`. The latter is a
+    ``tally`` snapshot when the poll's options changed and otherwise a ``tally_delta``
+    carrying only the new totals of changed options. Frames are numbered per poll within
+    this scheduler's ``epoch``; a client that sees a gap in ``seq`` asks for a
+    :meth:`snapshot` to resync.
+
+    With several workers (``refresh``), the tallies of the dirty polls are re-read from
+    ``poll_option_counts`` at push time, so every push carries the committed totals of all
+    workers rather than only the votes this worker saw. Pushes of different workers can
+    still be delivered out of order; since totals never decrease, a client applying frames
+    of another epoch keeps the larger total of each option.
+    """
+
+    def __init__(self, tally_cache: TallyCache, publish: Callable[[List[dict], List[dict]], Awaitable],
+                 interval: float = 0.1, max_polls: int = 10_000, refresh: bool = False):
+        self._tally_cache = tally_cache
+        self._publish = publish
+        self._refresh = refresh
+        self.interval = interval
+        self._max_polls = max_polls
+        self.epoch = uuid.uuid4().hex[:8]
+        self._dirty: Set[str] = set()
+        self._states: Dict[str, PollPushState] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.marked = 0
+        self.pushed = 0
+        self.deltas = 0
+        self.tick_latency = Histogram()
+
+    def mark_dirty(self, poll_id: str):
+        self.marked += 1
+        self._dirty.add(poll_id)
+
+    def _frame(self, kind: str, poll_id: str, seq: int, **fields) -> dict:
+        return {"type": kind, "v": PROTOCOL_VERSION, "poll_id": poll_id, "epoch": self.epoch, "seq": seq,
+                **fields}
+
+    def _snapshot_frame(self, poll_id: str, state: PollPushState) -> dict:
+        return self._frame("tally", poll_id, state.seq, totals=dict(state.totals), options=state.options)
+
+    async def snapshot(self, poll_id: str) -> Optional[dict]:
+        """Snapshot frame of a poll as of the last push, for subscribing and resyncing clients.
+        """
+        state = self._states.get(poll_id)
+        if state is None:
+            tally = await self._tally_cache.get(poll_id)
+            if tally is None:
+                return None
+            state = self._store(poll_id, PollPushState(tally))
+        return self._snapshot_frame(poll_id, state)
+
+    def _store(self, poll_id: str, state: PollPushState) -> PollPushState:
+        self._states.pop(poll_id, None)
+        self._states[poll_id] = state
+        while len(self._states) > self._max_polls:
+            del self._states[next(iter(self._states))]
+        return state
+
+    def _advance(self, tally: PollTally) -> Optional[Tuple[dict, PollPushState]]:
+        """The frame to push for a tally and the baseline to keep once it is published.
+        """
+        state = self._states.get(tally.poll_id)
+        if state is None or state.options != tally.options:
+            state = PollPushState(tally, state.seq + 1 if state is not None else 1)
+            return self._snapshot_frame(tally.poll_id, state), state
+        changes = {option_id: total for option_id, total in tally.totals.items()
+                   if state.totals.get(option_id) != total}
+        if not changes:
+            return None
+        state = PollPushState(tally, state.seq + 1)
+        return self._frame("tally_delta", tally.poll_id, state.seq, totals=changes), state
+
+    async def tick(self) -> int:
+        """Push every dirty poll once; returns the number of polls published.
+        """
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        try:
+            with Span(self.tick_latency):
+                return await self._push(dirty)
+        except BaseException:
+            # Nothing was advanced; retry these polls on the next tick
+            self._dirty |= dirty
+            raise
+
+    async def _push(self, dirty: Set[str]) -> int:
+        notifications, frames, states = [], [], []
+        if self._refresh:
+            # One query for every dirty poll; the push itself is the notification
+            await self._tally_cache.reconcile(dirty, notify=False)
+        for poll_id in dirty:
+            tally = await self._tally_cache.get(poll_id)
+            if tally is None:
+                self._states.pop(poll_id, None)
+                continue
+            advanced = self._advance(tally)
+            if advanced is None:
+                continue
+            frame, state = advanced
+            frames.append(frame)
+            states.append((poll_id, state))
+            notifications.append(tally.notification().dict())
+        if frames:
+            await self._publish(notifications, frames)
+            for poll_id, state in states:
+                self._store(poll_id, state)
+            self.pushed += len(frames)
+            self.deltas += sum(1 for frame in frames if frame["type"] == "tally_delta")
+        return len(frames)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Tally push failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Push what is pending, then stop ticking. A failed final push is logged, not raised,
+        so it does not keep the rest of the shutdown from running.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.tick()
+        except Exception:
+            logger.exception("Final tally push failed; %d polls not pushed", len(self._dirty))
+
+    def stats(self) -> dict:
+        return {"marked": self.marked, "pushed": self.pushed, "deltas": self.deltas, "dirty": len(self._dirty)}
@@ -0,0 +1,103 @@
+"""Registry of the parameterized statements on the hot paths.
+
+Every statement renders to one fixed SQL string whatever its parameters are, so
+SQLAlchemy compiles it once (compiled cache) and asyncpg prepares it once per connection
+(``DATABASE_STATEMENT_CACHE_SIZE``). Variable-length inputs are passed as Postgres arrays
+(``= ANY(...)``, ``unnest(...)``) rather than expanded into ``IN (...)`` lists or
+multi-row ``VALUES`` whose SQL changes with every length.
+"""
+from typing import Dict
+
+from sqlalchemy import String, and_, bindparam, select, func, text, any_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import Executable
+
+from project.polls.models import Poll, Option, Vote, User, PollOptionCount
+
+# Inserts the batch and increments poll_option_counts for the rows actually inserted, in
+# one statement. Count rows are upserted in key order so concurrent batches lock them in
+# the same order. Every inserted vote comes back with the absolute total of its option
+# after the increment, which the tally cache sets instead of counting on its own.
+VOTE_INSERT = text(
+    "WITH inserted AS ("
+    "INSERT INTO votes (id, poll_id, option_id, user_id, created_at) "
+    "SELECT v.id, v.poll_id, v.option_id, v.user_id, now() "
+    "FROM unnest(CAST(:ids AS varchar[]), CAST(:poll_ids AS varchar[]), "
+    "CAST(:option_ids AS varchar[]), CAST(:user_ids AS varchar[])) AS v(id, poll_id, option_id, user_id) "
+    "ON CONFLICT ON CONSTRAINT unique_vote DO NOTHING "
+    "RETURNING id, poll_id, option_id"
+    "), counted AS ("
+    "INSERT INTO poll_option_counts (poll_id, option_id, total) "
+    "SELECT poll_id, option_id, count(*) FROM inserted GROUP BY poll_id, option_id ORDER BY poll_id, option_id "
+    "ON CONFLICT (poll_id, option_id) DO UPDATE SET total = poll_option_counts.total + EXCLUDED.total "
+    "RETURNING poll_id, option_id, total"
+    ") "
+    "SELECT inserted.id, counted.total FROM inserted JOIN counted USING (poll_id, option_id)"
+).columns(Vote.id, PollOptionCount.total)
+
+# Primary-key lookups into poll_option_counts, no aggregate over votes.
+TALLY = (
+    select(Poll.id, Poll.question, Option.id, Option.option, func.coalesce(PollOptionCount.total, 0))
+    .join(Option, Option.poll_id == Poll.id)
+    .outerjoin(PollOptionCount, and_(PollOptionCount.poll_id == Option.poll_id,
+                                     PollOptionCount.option_id == Option.id))
+    .where(Poll.id == any_(bindparam("poll_ids", type_=ARRAY(String))))
+    .order_by(Poll.id, Option.option)
+)
+
+# Users that voted on a poll, to warm the in-memory voted set (project/polls/dedup.py).
+# Limited so that a poll too large to hold is found out without reading all its voters.
+VOTERS = select(Vote.user_id).where(Vote.poll_id == bindparam("poll_id")).limit(bindparam("limit"))
+
+POLL_EXISTS = select(Poll.id).where(Poll.id == bindparam("poll_id"))
+
+# One keyset page of a poll's votes for the export (project/polls/export.py). The
+# unique_vote index on (poll_id, user_id) serves the filter, the order and the seek to
+# the last user_id of the previous page, so a page costs the same at any depth.
+EXPORT_VOTES = (
+    select(Vote.id, Vote.user_id, Vote.option_id, Vote.created_at)
+    .where(Vote.poll_id == bindparam("poll_id"), Vote.user_id > bindparam("after"))
+    .order_by(Vote.user_id)
+    .limit(bindparam("limit"))
+)
+
+USER_BY_ID = select(User.id, User.name).where(User.id == bindparam("user_id"))
+
+USERS_BY_IDS = select(User.id, User.name).where(User.id == any_(bindparam("user_ids", type_=ARRAY(String))))
+
+USERS = select(User.id, User.name)
+
+POLL_OPTIONS = select(Poll.id, Poll.question, Option.id, Option.option).join(Option, Poll.id == Option.poll_id)
+
+# First statement of a bulk load transaction, see project/polls/bulk.py
+BULK_BEGIN = text("SELECT 1")
+
+# Rebuild of poll_option_counts from votes, see project/polls/repair.py. The exclusive
+# lock makes concurrent vote inserts wait, so no increment is lost or counted twice.
+COUNTS_LOCK = text("LOCK TABLE poll_option_counts IN EXCLUSIVE MODE")
+
+COUNTS_DELETE = text("DELETE FROM poll_option_counts")
+
+COUNTS_DELETE_POLL = text("DELETE FROM poll_option_counts WHERE poll_id = :poll_id")
+
+COUNTS_REBUILD = text(
+    "INSERT INTO poll_option_counts (poll_id, option_id, total) "
+    "SELECT poll_id, option_id, count(*) FROM votes GROUP BY poll_id, option_id"
+)
+
+COUNTS_REBUILD_POLL = text(
+    "INSERT INTO poll_option_counts (poll_id, option_id, total) "
+    "SELECT poll_id, option_id, count(*) FROM votes WHERE poll_id = :poll_id GROUP BY poll_id, option_id"
+)
+
+STATEMENTS: Dict[str, Executable] = {
+    "vote_insert": VOTE_INSERT,
+    "tally": TALLY,
+    "voters": VOTERS,
+    "poll_exists": POLL_EXISTS,
+    "export_votes": EXPORT_VOTES,
+    "user_by_id": USER_BY_ID,
+    "users_by_ids": USERS_BY_IDS,
+    "users": USERS,
+    "poll_options": POLL_OPTIONS,
+}
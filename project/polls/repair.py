@@ -0,0 +1,45 @@
+"""Rebuild ``poll_option_counts`` from ``votes``.
+
+Usage: python -m project.polls.repair [--poll POLL_ID]
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from rich.console import Console
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.polls import queries
+
+console = Console()
+
+
+async def rebuild_counts(engine: AsyncEngine, poll_id: Optional[str] = None) -> int:
+    """Recount every poll, or only ``poll_id``, in one transaction; returns the rows written.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(queries.COUNTS_LOCK)
+        if poll_id is None:
+            await conn.execute(queries.COUNTS_DELETE)
+            result = await conn.execute(queries.COUNTS_REBUILD)
+        else:
+            await conn.execute(queries.COUNTS_DELETE_POLL, {"poll_id": poll_id})
+            result = await conn.execute(queries.COUNTS_REBUILD_POLL, {"poll_id": poll_id})
+        return result.rowcount
+
+
+async def main(poll_id: Optional[str] = None):
+    from project.database import engine
+
+    start = time.perf_counter()
+    rows = await rebuild_counts(engine, poll_id)
+    await engine.dispose()
+    console.print(f"Rebuilt {rows} poll option counts in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--poll", help="only rebuild the counts of this poll")
+    args = parser.parse_args()
+    asyncio.run(main(args.poll))
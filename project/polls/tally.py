@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from project.cache import SingleFlight
+from project.metrics import Histogram, Span
+from project.polls import queries
+from project.schemas import VoteNotification
+
+logger = logging.getLogger(__name__)
+
+
+class PollTally:
+    """Vote totals of a single poll, keyed by option id."""
+
+    def __init__(self, poll_id: str, question: str):
+        self.poll_id = poll_id
+        self.question = question
+        self.options: Dict[str, str] = {}
+        self.totals: Dict[str, int] = {}
+
+    def add_option(self, option_id: str, option: str, total: int):
+        self.options[option_id] = option
+        self.totals[option_id] = total
+
+    def votes(self) -> List[dict]:
+        return [{"option": self.options[option_id], "total": total} for option_id, total in self.totals.items()]
+
+    def notification(self) -> VoteNotification:
+        return VoteNotification(poll_id=self.poll_id, question=self.question, votes=self.votes())
+
+
+class TallyCache:
+    """In-process vote tallies, warmed from ``poll_option_counts`` on first access.
+
+    Committed votes are applied with :meth:`set_total`, from the absolute totals the vote
+    insert returns, so building a ``VoteNotification`` does not touch the database. Totals
+    only grow: the larger of the cached and the new value wins, and totals set while a poll
+    is being loaded or reconciled are applied on top of the loaded ones. Votes committed by
+    other workers are picked up by the periodic :meth:`reconcile` pass, which tells
+    ``on_changed`` about every poll whose tally it changed.
+    """
+
+    def __init__(self, engine: AsyncEngine, reconcile_interval: float = 30.0, max_polls: int = 10_000):
+        self._engine = engine
+        self._reconcile_interval = reconcile_interval
+        self._max_polls = max_polls
+        self._tallies: "OrderedDict[str, PollTally]" = OrderedDict()
+        # Concurrent first reads of a poll share one query
+        self._loads = SingleFlight()
+        # Loads in flight per poll, and totals set while they run
+        self._loading: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self.on_changed: Optional[Callable[[str], None]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.load_latency = Histogram()
+
+    def __len__(self) -> int:
+        return len(self._tallies)
+
+    async def _load(self, poll_ids: Iterable[str]) -> Dict[str, PollTally]:
+        """Tallies from the database, with the totals set while the query ran applied.
+
+        Callers store the result without awaiting in between, so no total can slip past.
+        """
+        poll_ids = list(poll_ids)
+        for poll_id in poll_ids:
+            self._loading[poll_id] = self._loading.get(poll_id, 0) + 1
+        tallies: Dict[str, PollTally] = {}
+        try:
+            with Span(self.load_latency):
+                async with self._engine.connect() as conn:
+                    result = await conn.execute(queries.TALLY, {"poll_ids": poll_ids})
+                    for poll_id, question, option_id, option, total in result:
+                        tally = tallies.get(poll_id)
+                        if tally is None:
+                            tally = tallies[poll_id] = PollTally(poll_id, question)
+                        tally.add_option(option_id, option, total)
+        finally:
+            for poll_id in poll_ids:
+                pending = self._pending.get(poll_id)
+                tally = tallies.get(poll_id)
+                if pending and tally is not None:
+                    for option_id, total in pending.items():
+                        if total > tally.totals.get(option_id, total):
+                            tally.totals[option_id] = total
+                self._loading[poll_id] -= 1
+                if not self._loading[poll_id]:
+                    del self._loading[poll_id]
+                    self._pending.pop(poll_id, None)
+        return tallies
+
+    def _store(self, tally: PollTally):
+        self._tallies[tally.poll_id] = tally
+        self._tallies.move_to_end(tally.poll_id)
+        while len(self._tallies) > self._max_polls:
+            self._tallies.popitem(last=False)
+
+    async def get(self, poll_id: str) -> Optional[PollTally]:
+        """Return the tally of a poll, loading it from the database on first access.
+        """
+        tally = self._tallies.get(poll_id)
+        if tally is not None:
+            self._tallies.move_to_end(poll_id)
+            return tally
+        return await self._loads.run(poll_id, self._load_one)
+
+    async def _load_one(self, poll_id: str) -> Optional[PollTally]:
+        tally = (await self._load([poll_id])).get(poll_id)
+        if tally is not None:
+            self._store(tally)
+        return tally
+
+    def set_total(self, poll_id: str, option_id: str, total: int):
+        """Apply the committed total of an option. Polls that are not cached yet read it when warmed.
+        """
+        if poll_id in self._loading:
+            pending = self._pending.setdefault(poll_id, {})
+            pending[option_id] = max(total, pending.get(option_id, 0))
+        tally = self._tallies.get(poll_id)
+        if tally is not None and total > tally.totals.get(option_id, total):
+            tally.totals[option_id] = total
+
+    async def notification(self, poll_id: str) -> Optional[VoteNotification]:
+        tally = await self.get(poll_id)
+        return tally.notification() if tally is not None else None
+
+    def invalidate(self, poll_id: str):
+        self._tallies.pop(poll_id, None)
+
+    async def reconcile(self, poll_ids: Optional[Iterable[str]] = None, notify: bool = True):
+        """Refresh the cached polls among ``poll_ids``, or all of them, in a single query.
+
+        With ``notify``, ``on_changed`` is called for every poll whose tally changed.
+        """
+        poll_ids = [poll_id for poll_id in (self._tallies if poll_ids is None else poll_ids)
+                    if poll_id in self._tallies]
+        if not poll_ids:
+            return
+        fresh = await self._load(poll_ids)
+        for poll_id in poll_ids:
+            tally = fresh.get(poll_id)
+            cached = self._tallies.get(poll_id)
+            if tally is None:
+                self._tallies.pop(poll_id, None)
+            elif cached is not None:
+                self._tallies[poll_id] = tally
+                changed = cached.totals != tally.totals or cached.options != tally.options
+                if notify and changed and self.on_changed is not None:
+                    self.on_changed(poll_id)
+
+    async def _reconcile_forever(self):
+        while True:
+            await asyncio.sleep(self._reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Tally reconciliation failed")
+
+    def start(self):
+        if self._task is None and self._reconcile_interval:
+            self._task = asyncio.get_event_loop().create_task(self._reconcile_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Startup steps running in the background while the app already accepts requests.
+
+    Each step is retried with exponential backoff until it succeeds. The app is ready
+    once every required step has completed; optional steps such as cache warm-up only
+    shorten the first requests. Timings are measured from :meth:`start`, which the
+    lifespan calls when it begins, or else from construction.
+    """
+
+    def __init__(self, max_backoff: float = 30.0):
+        self._max_backoff = max_backoff
+        self._started = time.monotonic()
+        self._required: Dict[str, bool] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.durations: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready_after: Optional[float] = None
+        self.first_request_after: Optional[float] = None
+
+    def start(self):
+        """Start the clock of the timings."""
+        self._started = time.monotonic()
+
+    def run(self, name: str, step: Callable[[], Awaitable], required: bool = True) -> asyncio.Task:
+        self._required[name] = required
+        task = self._tasks[name] = asyncio.get_event_loop().create_task(self._run(name, step))
+        return task
+
+    async def _run(self, name: str, step: Callable[[], Awaitable]):
+        backoff = min(0.5, self._max_backoff)
+        while True:
+            try:
+                await step()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors[name] = repr(e)
+                logger.warning("Startup step %s failed, retrying in %.1fs: %r", name, backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+        self.errors.pop(name, None)
+        self.durations[name] = time.monotonic() - self._started
+        logger.info("Startup step %s done after %.3fs", name, self.durations[name])
+        if self.ready_after is None and self.ready:
+            self.ready_after = time.monotonic() - self._started
+            logger.info("Ready after %.3fs", self.ready_after)
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self.durations for name, required in self._required.items() if required)
+
+    def request_started(self):
+        """Called for every request; only the first one is recorded."""
+        if self.first_request_after is None:
+            self.first_request_after = time.monotonic() - self._started
+
+    async def wait(self, timeout: Optional[float] = None):
+        """Wait for the required steps."""
+        await asyncio.wait_for(asyncio.gather(*(
+            task for name, task in self._tasks.items() if self._required[name]
+        )), timeout)
+
+    async def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_after": self.ready_after,
+            "first_request_after": self.first_request_after,
+            "steps": {name: self.durations.get(name) for name in self._required},
+            "errors": dict(self.errors),
+        }
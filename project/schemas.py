@@ -1,8 +1,9 @@
-import json
-from typing import List, Any
+from typing import List, Any, Optional
 
 from pydantic import BaseModel, validator
 
+from project.serializers import serializer
+
 
 class User(BaseModel):
     id: str
@@ -39,6 +40,7 @@ class VoteNotification(BaseModel):
 class Notification(BaseModel):
     broadcast: bool = False
     recipients: List[str] = []
+    topic: Optional[str] = None
     message: Any = None
 
     @validator("recipients")
@@ -50,8 +52,8 @@ class Notification(BaseModel):
     @validator("message")
     def message_must_be_json_serializable(cls, v):
         try:
-            json.dumps(v)
-        except TypeError:
+            serializer.dumps(v)
+        except (TypeError, ValueError):
             raise ValueError("message must be JSON serializable")
         return v
 
@@ -81,3 +83,11 @@ class Notification(BaseModel):
                 ]}
             }
         }
+
+
+class DecodedNotification(Notification):
+    """Notification parsed from a JSON body, whose message is serializable by construction."""
+
+    @validator("message")
+    def message_must_be_json_serializable(cls, v):
+        return v
@@ -0,0 +1,63 @@
+"""Pluggable JSON serialization for WebSocket frames and AMQP bodies.
+
+``serializer`` is orjson-backed (pinned in requirements.txt) and falls back to the
+standard library when orjson is not installed; ``JSON_SERIALIZER`` forces one or the other. Both produce compact JSON
+and accept anything ``jsonable_encoder`` understands (pydantic models, UUIDs, datetimes).
+"""
+import json
+from typing import Any, Union
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from project.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    return jsonable_encoder(obj)
+
+
+class JsonSerializer:
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.dumps_text(obj).encode()
+
+    def dumps_text(self, obj: Any) -> str:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps_text(self, obj: Any) -> str:
+        return self.dumps(obj).decode()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+def get_serializer(name: str = "auto") -> JsonSerializer:
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise RuntimeError("JSON_SERIALIZER=orjson but orjson is not installed")
+        return OrjsonSerializer()
+    if name in ("json", "auto"):
+        return JsonSerializer()
+    raise ValueError(f"Unknown JSON serializer {name!r}")
+
+
+serializer = get_serializer(settings.JSON_SERIALIZER)
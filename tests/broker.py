@@ -0,0 +1,205 @@
+"""In-process stand-in for RabbitMQ that speaks the subset of aio_pika used by the app.
+
+``InMemoryBroker.connect`` can be passed as ``connection_factory`` to ``PikaClient``.
+``latency`` simulates one network round trip for connects, channel opens and confirms.
+As with RabbitMQ, messages left unsettled when their channel closes are requeued as
+redelivered, and settling them afterwards raises.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+from aio_pika.exceptions import ChannelInvalidStateError
+
+
+class IncomingMessage:
+    def __init__(self, queue: "Queue", body: bytes, channel: "Channel", routing_key: str = "",
+                 redelivered: bool = False):
+        self._queue = queue
+        self._channel = channel
+        self.body = body
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+        self._settled = False
+        channel._unsettled.add(self)
+
+    def _settle(self):
+        if self._channel.is_closed:
+            raise ChannelInvalidStateError("channel closed")
+        if not self._settled:
+            self._settled = True
+            self._channel._unsettled.discard(self)
+            self._channel._release()
+
+    async def ack(self, multiple: bool = False):
+        self._settle()
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self._settle()
+        if requeue:
+            self._queue.put(self.body, self.routing_key, redelivered=True)
+
+    async def reject(self, requeue: bool = False):
+        await self.nack(requeue=requeue)
+
+
+class Queue:
+    def __init__(self, broker: "InMemoryBroker", name: str):
+        self.broker = broker
+        self.name = name
+        self._messages: "asyncio.Queue" = asyncio.Queue()
+        self._consumers: List[asyncio.Task] = []
+        self._channel: Optional["Channel"] = None
+
+    def put(self, body: bytes, routing_key: str = "", redelivered: bool = False):
+        self._messages.put_nowait((body, routing_key, redelivered))
+
+    def qsize(self) -> int:
+        return self._messages.qsize()
+
+    async def bind(self, exchange, routing_key: str = ""):
+        name = exchange if isinstance(exchange, str) else exchange.name
+        self.broker.exchanges[name].bindings[routing_key].add(self)
+
+    async def unbind(self, exchange, routing_key: str = ""):
+        name = exchange if isinstance(exchange, str) else exchange.name
+        self.broker.exchanges[name].bindings[routing_key].discard(self)
+
+    async def consume(self, callback: Callable, no_ack: bool = False, channel: Optional["Channel"] = None):
+        channel = channel or self._channel
+
+        async def deliver():
+            while True:
+                await channel._acquire()
+                body, routing_key, redelivered = await self._messages.get()
+                message = IncomingMessage(self, body, channel, routing_key, redelivered)
+                if no_ack:
+                    message._settle()
+                asyncio.get_event_loop().create_task(callback(message))
+
+        self._consumers.append(asyncio.get_event_loop().create_task(deliver()))
+        return f"ctag-{len(self._consumers)}"
+
+    def _cancel(self):
+        for task in self._consumers:
+            task.cancel()
+        self._consumers = []
+
+
+class Exchange:
+    def __init__(self, broker: "InMemoryBroker", name: str = "", type: str = "direct"):
+        self.broker = broker
+        self.name = name
+        self.type = getattr(type, "value", type)
+        self.bindings: Dict[str, Set[Queue]] = defaultdict(set)
+
+    async def publish(self, message, routing_key: str = "", **kwargs):
+        await self.broker._round_trip()
+        self.broker.published += 1
+        if self.name == "":
+            queue = self.broker.queues.get(routing_key)
+            targets = [queue] if queue is not None else []
+        elif self.type == "fanout":
+            targets = {queue for queues in self.bindings.values() for queue in queues}
+        else:
+            targets = self.bindings.get(routing_key, ())
+        for queue in targets:
+            queue.put(message.body, routing_key)
+
+
+class Channel:
+    def __init__(self, connection: "Connection"):
+        self.connection = connection
+        self.broker = connection.broker
+        self.default_exchange = self.broker.exchanges[""]
+        self.is_closed = False
+        self._prefetch: Optional[asyncio.Semaphore] = None
+        self._queues: List[Queue] = []
+        self._unsettled: Set[IncomingMessage] = set()
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs):
+        self._prefetch = asyncio.Semaphore(prefetch_count) if prefetch_count else None
+
+    async def _acquire(self):
+        if self._prefetch is not None:
+            await self._prefetch.acquire()
+
+    def _release(self):
+        if self._prefetch is not None:
+            self._prefetch.release()
+
+    async def declare_queue(self, name: str = "", durable: bool = False, auto_delete: bool = False,
+                            exclusive: bool = False, **kwargs) -> Queue:
+        await self.broker._round_trip()
+        if not name:
+            self.broker._anonymous += 1
+            name = f"amq.gen-{self.broker._anonymous}"
+        queue = self.broker.queues.get(name)
+        if queue is None:
+            queue = self.broker.queues[name] = Queue(self.broker, name)
+        queue._channel = self
+        self._queues.append(queue)
+        return queue
+
+    async def declare_exchange(self, name: str, type="direct", **kwargs) -> Exchange:
+        await self.broker._round_trip()
+        exchange = self.broker.exchanges.get(name)
+        if exchange is None:
+            exchange = self.broker.exchanges[name] = Exchange(self.broker, name, type)
+        return exchange
+
+    async def get_exchange(self, name: str, **kwargs) -> Exchange:
+        return self.broker.exchanges[name]
+
+    async def close(self):
+        self.is_closed = True
+        for queue in self._queues:
+            queue._cancel()
+        for message in self._unsettled:
+            message._queue.put(message.body, message.routing_key, redelivered=True)
+        self._unsettled.clear()
+
+
+class Connection:
+    def __init__(self, broker: "InMemoryBroker"):
+        self.broker = broker
+        self.is_closed = False
+        self._channels: List[Channel] = []
+
+    async def channel(self, *args, **kwargs) -> Channel:
+        await self.broker._round_trip()
+        channel = Channel(self)
+        self._channels.append(channel)
+        return channel
+
+    async def close(self):
+        self.is_closed = True
+        for channel in self._channels:
+            await channel.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class InMemoryBroker:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.queues: Dict[str, Queue] = {}
+        self.exchanges: Dict[str, Exchange] = {"": Exchange(self, "")}
+        self.connections_opened = 0
+        self.published = 0
+        self._anonymous = 0
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def connect(self, url: Optional[str] = None, **kwargs) -> Connection:
+        # AMQP connection setup is several round trips (TCP, protocol header, tune, open).
+        for _ in range(3):
+            await self._round_trip()
+        self.connections_opened += 1
+        return Connection(self)
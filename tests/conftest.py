@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from tests.fakes import FakeEngine
+
+# Before project.config is imported: small pool, pre-ping on, as in the test environment
+os.environ.setdefault("FASTAPI_CONFIG", "testing")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def engine():
+    """The app's engine, for tests that need Postgres; set DATABASE_URL to run them.
+
+    The default DATABASE_URL points at a shared server, so it is never used implicitly.
+    """
+    if "DATABASE_URL" not in os.environ:
+        pytest.skip("DATABASE_URL is not set")
+    from project.database import engine
+    yield engine
+    # Pooled asyncpg connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+def fake_engine():
+    """A FakeEngine answering nothing; tests set its ``handler``."""
+    return FakeEngine()
@@ -0,0 +1,111 @@
+"""In-process stand-ins shared by the tests and the benchmarks.
+
+``FakeWebSocket`` replaces a starlette WebSocket and ``FakeEngine`` an ``AsyncEngine``;
+the RabbitMQ stand-in is :class:`tests.broker.InMemoryBroker`.
+"""
+import asyncio
+import json
+import random
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+
+class FakeWebSocket:
+    """Stand-in for a starlette WebSocket that records frames instead of writing them."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fail: bool = False, stall: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail = fail
+        self.stall = stall
+        self.sent: List[str] = []
+        self.closed = False
+
+    async def _wait(self):
+        if self.stall:
+            await asyncio.sleep(3600)
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.fail:
+            raise ConnectionResetError("fake socket reset")
+
+    async def send_text(self, data: str):
+        await self._wait()
+        self.sent.append(data)
+
+    async def send_json(self, data, mode: str = "text"):
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        self.closed = True
+
+
+class FakeResult:
+    """Rows of one statement, read like a ``CursorResult`` or a streamed result."""
+
+    def __init__(self, rows: Sequence[Any]):
+        self._rows = list(rows)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._rows)
+
+    def all(self) -> List[Any]:
+        return list(self._rows)
+
+    def scalars(self) -> Iterator[Any]:
+        return (row[0] for row in self._rows)
+
+    def first(self) -> Optional[Any]:
+        return self._rows[0] if self._rows else None
+
+    async def partitions(self, size: int):
+        for start in range(0, len(self._rows), size):
+            yield self._rows[start:start + size]
+
+
+class FakeConnection:
+    def __init__(self, engine: "FakeEngine"):
+        self._engine = engine
+
+    async def execute(self, statement, params: Optional[Dict[str, Any]] = None) -> FakeResult:
+        return FakeResult(await self._engine.run(statement, params or {}))
+
+    async def stream(self, statement, params: Optional[Dict[str, Any]] = None) -> FakeResult:
+        return await self.execute(statement, params)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeEngine:
+    """Stand-in for an ``AsyncEngine``; ``handler(params)`` answers every statement.
+
+    ``begin()`` and ``connect()`` both hand out a connection whose statements return the
+    handler's rows, or raise what it raises. ``executed`` records the parameters of each
+    statement; while ``gate`` is cleared, statements wait before returning the rows
+    they read when they started.
+    """
+
+    def __init__(self, handler: Optional[Callable[[Dict[str, Any]], Sequence[Any]]] = None):
+        self.handler = handler or (lambda params: [])
+        self.executed: List[Dict[str, Any]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def run(self, statement, params: Dict[str, Any]) -> Sequence[Any]:
+        self.executed.append(params)
+        # Answered from the data as it is when the statement starts, like a snapshot
+        rows = self.handler(params)
+        # Let concurrent callers in, as a database round trip would
+        await asyncio.sleep(0)
+        await self.gate.wait()
+        return rows
+
+    def begin(self) -> FakeConnection:
+        return FakeConnection(self)
+
+    def connect(self) -> FakeConnection:
+        return FakeConnection(self)
@@ -0,0 +1,55 @@
+from typing import Tuple
+
+import pytest
+
+from project import create_app, run_shutdown_steps
+from project.log import shutdown_logging
+from tests.broker import InMemoryBroker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_every_shutdown_step_runs_when_one_fails(caplog):
+    ran = []
+
+    async def failing():
+        ran.append("failing")
+        raise ConnectionError("broker unavailable")
+
+    async def close():
+        ran.append("close")
+
+    await run_shutdown_steps([failing, close, lambda: ran.append("sync")])
+    assert ran == ["failing", "close", "sync"]
+    assert "Shutdown step" in caplog.text and "failing" in caplog.text
+
+
+async def get(app, path: str) -> Tuple[dict, bytes]:
+    """One GET request straight through the ASGI app; its response start message and body."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+               "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+               "client": ("test", 1), "server": ("test", 80)}, receive, send)
+    return messages[0], b"".join(message.get("body", b"") for message in messages[1:])
+
+
+async def test_metrics_route_serves_the_registry():
+    app = create_app(amqp_connection_factory=InMemoryBroker().connect)
+    try:
+        app.metrics.gauge("test_value", lambda: 7, "Set by the test")
+        start, body = await get(app, "/metrics")
+    finally:
+        shutdown_logging()
+    assert start["status"] == 200
+    assert dict(start["headers"])[b"content-type"].startswith(b"text/plain; version=0.0.4")
+    lines = body.decode().splitlines()
+    assert "# TYPE app_vote_commit_seconds histogram" in lines
+    assert 'app_vote_commit_seconds_bucket{le="+Inf"} 0' in lines
+    assert lines[-3:] == ["# HELP app_test_value Set by the test", "# TYPE app_test_value gauge", "app_test_value 7"]
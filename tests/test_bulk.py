@@ -0,0 +1,106 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from project.polls.bulk import (BulkInputError, CopyLoader, csv_records, ndjson_records, poll_batches, poll_rows,
+                                user_batches)
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunked(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+async def test_ndjson_records_split_across_chunks():
+    body = b'{"name": "a"}\n\n{"name": "b"}\n{"name": "c"}'
+    assert await collect(ndjson_records(chunked(body))) == [(1, {"name": "a"}), (3, {"name": "b"}),
+                                                            (4, {"name": "c"})]
+
+
+async def test_ndjson_records_reports_the_bad_line():
+    with pytest.raises(BulkInputError) as info:
+        await collect(ndjson_records(chunked(b'{"name": "a"}\n[1]\n')))
+    assert info.value.line == 2
+
+
+async def test_csv_records_with_header_bom_and_quotes():
+    body = '﻿name,id\nAlice,u1\n"Bob, Jr",\nCarol,u3'.encode()
+    assert await collect(csv_records(chunked(body, 5))) == [
+        (2, {"name": "Alice", "id": "u1"}), (3, {"name": "Bob, Jr", "id": ""}), (4, {"name": "Carol", "id": "u3"}),
+    ]
+
+
+def test_poll_rows_generates_missing_ids():
+    poll, options = poll_rows(1, {"question": "q", "options": ["a", {"option": "b", "id": "o2"}]})
+    assert poll[1] == "q"
+    assert [option[1] for option in options] == [poll[0], poll[0]]
+    assert options[1][0] == "o2" and options[1][2] == "b"
+
+
+@pytest.mark.parametrize("record", [{"question": "q"}, {"question": "q", "options": []},
+                                    {"options": ["a"]}, {"question": "q", "options": [1]},
+                                    {"id": "x" * 129, "question": "q", "options": ["a"]}])
+def test_poll_rows_rejects(record):
+    with pytest.raises(BulkInputError):
+        poll_rows(1, record)
+
+
+async def test_batches_keep_polls_with_their_options():
+    records = ndjson_records(chunked(b"".join(
+        b'{"question": "q%d", "options": ["a", "b"]}\n' % i for i in range(5)
+    )))
+    batches = await collect(poll_batches(records, chunk_size=6))
+    assert [[len(rows) for _, _, rows in batch] for batch in batches] == [[2, 4], [2, 4], [1, 2]]
+    assert [table for table, _, _ in batches[0]] == ["polls", "options"]
+
+
+async def test_copy_commits_on_reused_connections(engine):
+    """Every chunk is committed, including on pooled connections that pre-ping already used."""
+    tag = uuid.uuid4().hex[:8]
+    body = b"".join(b'{"question": "%s %d", "options": ["a", "b"]}\n' % (tag.encode(), i) for i in range(8))
+    users = "name\n" + "".join(f"{tag}-{i}\n" for i in range(5))
+    polls = CopyLoader(engine)
+    await polls.load(poll_batches(ndjson_records(chunked(body)), chunk_size=3))
+    loaded_users = CopyLoader(engine)
+    await loaded_users.load(user_batches(csv_records(chunked(users.encode())), chunk_size=2))
+    try:
+        assert polls.created == {"polls": 8, "options": 16} and polls.chunks == 8
+        assert loaded_users.created == {"users": 5} and loaded_users.chunks == 3
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT count(*) FROM polls WHERE question LIKE :tag"),
+                                       {"tag": f"{tag} %"})).scalar() == 8
+            assert (await conn.execute(text(
+                "SELECT count(*) FROM options o JOIN polls p ON p.id = o.poll_id WHERE p.question LIKE :tag"
+            ), {"tag": f"{tag} %"})).scalar() == 16
+            assert (await conn.execute(text("SELECT count(*) FROM users WHERE name LIKE :tag"),
+                                       {"tag": f"{tag}-%"})).scalar() == 5
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM options USING polls WHERE polls.id = options.poll_id "
+                                    "AND polls.question LIKE :tag"), {"tag": f"{tag} %"})
+            await conn.execute(text("DELETE FROM polls WHERE question LIKE :tag"), {"tag": f"{tag} %"})
+            await conn.execute(text("DELETE FROM users WHERE name LIKE :tag"), {"tag": f"{tag}-%"})
+
+
+async def test_failed_chunk_is_rolled_back(engine):
+    poll_id = str(uuid.uuid4())
+    body = (b'{"id": "%s", "question": "dup", "options": ["a"]}\n' % poll_id.encode()) * 2
+    loader = CopyLoader(engine)
+    try:
+        with pytest.raises(Exception):
+            await loader.load(poll_batches(ndjson_records(chunked(body)), chunk_size=2))
+        assert loader.created == {}
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT count(*) FROM polls WHERE id = :id"),
+                                       {"id": poll_id})).scalar() == 0
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM options WHERE poll_id = :id"), {"id": poll_id})
+            await conn.execute(text("DELETE FROM polls WHERE id = :id"), {"id": poll_id})
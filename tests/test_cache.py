@@ -0,0 +1,108 @@
+import asyncio
+from collections import namedtuple
+
+import pytest
+
+from project.cache import AsyncCache, UserCache
+
+pytestmark = pytest.mark.anyio
+
+UserRow = namedtuple("UserRow", "id name")
+
+
+class Loader:
+    """load_one for AsyncCache: the key upper-cased, or the error set in ``fail``; waits on ``gate``."""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.fail = None
+
+    async def __call__(self, key):
+        self.calls.append(key)
+        await self.gate.wait()
+        if self.fail is not None:
+            raise self.fail
+        return None if key == "missing" else key.upper()
+
+
+async def test_entries_expire_after_the_ttl():
+    load = Loader()
+    cache = AsyncCache(load, ttl=0.01, negative_ttl=0.01)
+    assert await cache.get("a") == "A"
+    assert await cache.get("missing") is None
+    assert await cache.get("a") == "A"
+    assert load.calls == ["a", "missing"]
+    await asyncio.sleep(0.02)
+    await cache.get("a")
+    await cache.get("missing")
+    assert load.calls == ["a", "missing", "a", "missing"]
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = AsyncCache(Loader(), maxsize=2)
+    await cache.get("a")
+    await cache.get("b")
+    await cache.get("a")
+    await cache.get("c")
+    assert cache.peek("b") is None
+    assert cache.peek("a") == "A" and cache.peek("c") == "C"
+
+
+async def test_concurrent_misses_share_one_load():
+    load = Loader()
+    load.gate.clear()
+    cache = AsyncCache(load)
+    gets = asyncio.gather(*(cache.get("a") for _ in range(3)))
+    await asyncio.sleep(0)
+    load.gate.set()
+    assert await gets == ["A", "A", "A"]
+    assert load.calls == ["a"]
+    assert cache.stats()["coalesced"] == 2
+
+
+async def test_failed_load_reaches_every_caller_and_is_not_cached():
+    load = Loader()
+    load.gate.clear()
+    load.fail = ConnectionError("database unavailable")
+    cache = AsyncCache(load)
+    gets = asyncio.gather(*(cache.get("a") for _ in range(2)), return_exceptions=True)
+    await asyncio.sleep(0)
+    load.gate.set()
+    assert [type(result) for result in await gets] == [ConnectionError, ConnectionError]
+    load.fail = None
+    assert await cache.get("a") == "A"
+    assert load.calls == ["a", "a"]
+
+
+async def test_cancelled_first_caller_does_not_fail_the_others():
+    load = Loader()
+    load.gate.clear()
+    cache = AsyncCache(load)
+    first = asyncio.ensure_future(cache.get("a"))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(cache.get("a"))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    load.gate.set()
+    assert await second == "A"
+    assert first.cancelled()
+    assert cache.peek("a") == "A"
+    assert load.calls == ["a"]
+
+
+async def test_user_cache_loads_single_and_batched(fake_engine):
+    users = {"u1": UserRow("u1", "One"), "u2": UserRow("u2", "Two")}
+
+    # USER_BY_ID binds user_id, USERS_BY_IDS user_ids
+    fake_engine.handler = lambda params: [users[user_id] for user_id in params.get("user_ids", [params.get("user_id")])
+                                          if user_id in users]
+    cache = UserCache(fake_engine)
+    assert (await cache.get("u1")).name == "One"
+    found = await cache.get_many(["u1", "u2", "u3"])
+    assert {user_id: user and user.name for user_id, user in found.items()} == {"u1": "One", "u2": "Two",
+                                                                                "u3": None}
+    # u1 was cached; u2 and u3 came from one batched query
+    assert len(fake_engine.executed) == 2
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from project.cluster import ClusterRouter
+from project.core import PikaClient, WebSocketManager
+from project.schemas import Notification
+from tests.broker import InMemoryBroker
+from tests.fakes import FakeWebSocket
+
+pytestmark = pytest.mark.anyio
+
+
+def make_router(worker_id: str, client=None):
+    wm = WebSocketManager()
+    delivered = []
+    router = ClusterRouter(client, wm, delivered.extend, worker_id=worker_id, flush_interval=0.005)
+    return wm, router, delivered
+
+
+def parts(plan) -> dict:
+    return {worker: (sorted(part.recipients), part.topic) for worker, part in plan.items()}
+
+
+def test_plan_sends_each_worker_only_its_recipients():
+    wm, router, _ = make_router("w1")
+    wm.add_user("u1", "User 1", FakeWebSocket())
+    router._apply("w2", {"u2": True, "u3": True}, {})
+    router._apply("w3", {"u3": True}, {})
+    plan = router._plan(Notification(recipients=["u1", "u2", "u3", "unknown"], message="hi"))
+    assert parts(plan) == {"w1": (["u1"], None), "w2": (["u2", "u3"], None), "w3": (["u3"], None)}
+    assert all(part.message == "hi" for part in plan.values())
+
+
+def test_plan_routes_topics_to_workers_with_subscribers():
+    wm, router, _ = make_router("w1")
+    wm.subscribe("poll:p1", wm.add_user("u1", "User 1", FakeWebSocket()))
+    router._apply("w2", {"u2": True}, {"poll:p1": True})
+    router._apply("w3", {"u3": True}, {"poll:p2": True})
+    plan = router._plan(Notification(topic="poll:p1", recipients=["u3"], message="hi"))
+    assert parts(plan) == {"w1": ([], "poll:p1"), "w2": ([], "poll:p1"), "w3": (["u3"], None)}
+
+
+def test_plan_broadcasts_to_every_known_worker():
+    _, router, _ = make_router("w1")
+    router._last_seen.update({"w2": 0.0, "w3": 0.0})
+    assert set(router._plan(Notification(broadcast=True, message="hi"))) == {"w1", "w2", "w3"}
+
+
+def test_departed_users_and_workers_are_forgotten():
+    _, router, _ = make_router("w1")
+    router._apply("w2", {"u2": True}, {"poll:p1": True})
+    router._apply("w2", {"u2": False}, {})
+    assert router._plan(Notification(recipients=["u2"], message="hi")) == {}
+    router._forget_worker("w2")
+    assert router._plan(Notification(topic="poll:p1", message="hi")) == {}
+
+
+async def test_route_delivers_through_the_worker_holding_the_user():
+    broker = InMemoryBroker()
+    clients = [PikaClient(None, connection_factory=broker.connect) for _ in range(2)]
+    (wm1, router1, delivered1), (wm2, router2, delivered2) = (make_router(f"w{i}", client)
+                                                              for i, client in enumerate(clients, 1))
+    await router1.start()
+    await router2.start()
+    try:
+        wm1.add_user("u1", "User 1", FakeWebSocket())
+        wm2.add_user("u2", "User 2", FakeWebSocket())
+        await asyncio.sleep(0.05)
+        assert router1.workers == {"w2"}
+
+        published = broker.published
+        await router1.route([Notification(recipients=["u1", "u2"], message="hi")])
+        await asyncio.sleep(0.01)
+        assert [n.recipients for n in delivered1] == [["u1"]]
+        assert [n.recipients for n in delivered2] == [["u2"]]
+        assert broker.published - published == 1
+    finally:
+        for router, client in ((router1, clients[0]), (router2, clients[1])):
+            await router.stop()
+            await client.close()
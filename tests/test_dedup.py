@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from project.polls.dedup import VotedSet
+
+pytestmark = pytest.mark.anyio
+
+
+def voters(fake_engine, polls):
+    """Answer the VOTERS query from ``{poll_id: [user_id, ...]}``."""
+    fake_engine.handler = lambda params: [(user_id,) for user_id in polls.get(params["poll_id"], [])][:params["limit"]]
+    return fake_engine
+
+
+async def test_claim_rejects_known_voters(fake_engine):
+    voted = VotedSet(voters(fake_engine, {"p1": ["u1"]}))
+    assert not await voted.claim("p1", "u1")
+    assert await voted.claim("p1", "u2")
+    assert not await voted.claim("p1", "u2")
+    voted.release("p1", "u2")
+    assert await voted.claim("p1", "u2")
+    assert voted.stats()["rejected"] == 2
+    assert voted.stats()["entries"] == 2
+
+
+async def test_concurrent_claims_load_the_poll_once(fake_engine):
+    engine = voters(fake_engine, {"p1": ["u1"]})
+    voted = VotedSet(engine)
+    results = await asyncio.gather(*(voted.claim("p1", user) for user in ("u1", "u2", "u3")))
+    assert results == [False, True, True]
+    assert len(engine.executed) == 1
+
+
+async def test_total_entries_are_bounded(fake_engine):
+    engine = voters(fake_engine, {f"p{i}": [f"u{j}" for j in range(4)] for i in range(5)})
+    voted = VotedSet(engine, max_entries=10)
+    for i in range(5):
+        await voted.claim(f"p{i}", "new")
+    stats = voted.stats()
+    assert stats["entries"] <= 10
+    assert stats["polls"] == 2
+    assert stats["evicted"] == 3
+    # An evicted poll is loaded again, with what the database has
+    assert await voted.claim("p0", "u9")
+    assert len(engine.executed) == 6
+
+
+async def test_large_polls_are_left_to_the_database(fake_engine):
+    engine = voters(fake_engine, {"big": [f"u{i}" for i in range(10)], "small": ["u1"]})
+    voted = VotedSet(engine, max_poll_voters=5)
+    # Not held, so every claim goes through to the unique constraint
+    assert await voted.claim("big", "u1")
+    assert await voted.claim("big", "u1")
+    assert engine.executed[0]["limit"] == 6
+    assert voted.stats()["untracked_polls"] == 1
+    assert voted.stats()["entries"] == 0
+
+    for i in range(2, 6):
+        assert await voted.claim("small", f"u{i}")
+    assert voted.stats()["entries"] == 5
+    # One more voter than the threshold and the poll is dropped from memory
+    assert await voted.claim("small", "u6")
+    assert voted.stats()["untracked_polls"] == 2
+    assert voted.stats()["entries"] == 0
+    assert await voted.claim("small", "u1")
+
+
+async def test_replicated_votes_only_update_loaded_polls(fake_engine):
+    voted = VotedSet(fake_engine)
+    voted.add("p1", "u1")
+    assert await voted.claim("p1", "u1")
+    voted.add("p1", "u2")
+    assert not await voted.claim("p1", "u2")
+    voted.invalidate("p1")
+    assert voted.stats()["entries"] == 0
@@ -0,0 +1,61 @@
+import csv
+import datetime
+import io
+import json
+from collections import namedtuple
+
+import pytest
+
+from project.polls.export import VOTE_COLUMNS, encode, encode_csv, encode_ndjson, vote_chunks
+
+pytestmark = pytest.mark.anyio
+
+Row = namedtuple("Row", "id user_id option_id created_at")
+CREATED_AT = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def votes(fake_engine, count: int):
+    """Answer EXPORT_VOTES keyset pages from ``count`` votes by users u000, u001, ..."""
+    rows = [Row(f"v{i}", f"u{i:03}", "o1", CREATED_AT) for i in range(count)]
+    fake_engine.handler = lambda params: [row for row in rows if row.user_id > params["after"]][:params["limit"]]
+    return fake_engine
+
+
+async def collect(chunks) -> list:
+    return [chunk async for chunk in chunks]
+
+
+async def test_vote_chunks_page_by_user_id(fake_engine):
+    engine = votes(fake_engine, 25)
+    chunks = await collect(vote_chunks(engine, "p1", page_size=10, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2, 4, 4, 2, 4, 1]
+    assert [row[1] for chunk in chunks for row in chunk] == [f"u{i:03}" for i in range(25)]
+    # Each page starts after the last user of the previous one
+    assert [params["after"] for params in engine.executed] == ["", "u009", "u019"]
+    assert chunks[0][0] == ("v0", "u000", "o1", CREATED_AT.isoformat())
+
+
+async def test_vote_chunks_stop_after_an_exactly_full_page(fake_engine):
+    engine = votes(fake_engine, 10)
+    assert sum(len(chunk) for chunk in await collect(vote_chunks(engine, "p1", page_size=10, chunk_size=10))) == 10
+    assert [params["after"] for params in engine.executed] == ["", "u009"]
+
+
+def test_encode_ndjson():
+    body = encode_ndjson(("a", "b"), [(1, "x"), (2, "y")])
+    assert [json.loads(line) for line in body.splitlines()] == [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}]
+
+
+def test_encode_csv_quotes_values():
+    body = encode_csv([("v1", 'say "hi", twice')])
+    assert list(csv.reader(io.StringIO(body.decode()))) == [["v1", 'say "hi", twice']]
+
+
+async def test_encode_csv_starts_with_the_header():
+    async def chunks():
+        yield [("v1", "u1", "o1", "2024-01-01")]
+        yield [("v2", "u2", "o1", "2024-01-02")]
+
+    body = b"".join(await collect(encode(VOTE_COLUMNS, chunks(), "csv"))).decode()
+    assert list(csv.reader(io.StringIO(body))) == [list(VOTE_COLUMNS), ["v1", "u1", "o1", "2024-01-01"],
+                                                   ["v2", "u2", "o1", "2024-01-02"]]
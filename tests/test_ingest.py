@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from project.polls.dedup import VotedSet
+from project.polls.ingest import InvalidVote, VoteIngestor
+
+pytestmark = pytest.mark.anyio
+
+
+class VoteTable:
+    """votes and poll_option_counts behind VOTE_INSERT: (id, total) of every new vote."""
+
+    def __init__(self):
+        self.votes = set()
+        self.totals = {}
+
+    def insert(self, params):
+        if "ids" not in params:
+            # VOTERS of VotedSet
+            return [(user_id,) for poll_id, user_id in self.votes if poll_id == params["poll_id"]]
+        if "bad" in params["option_ids"]:
+            raise DBAPIError("INSERT", params, Exception("value too long for type character varying(128)"))
+        rows = []
+        for vote_id, poll_id, option_id, user_id in zip(params["ids"], params["poll_ids"], params["option_ids"],
+                                                        params["user_ids"]):
+            if (poll_id, user_id) not in self.votes:
+                self.votes.add((poll_id, user_id))
+                self.totals[poll_id, option_id] = self.totals.get((poll_id, option_id), 0) + 1
+                rows.append((vote_id, self.totals[poll_id, option_id]))
+        return rows
+
+
+@pytest.fixture
+def votes(fake_engine):
+    table = VoteTable()
+    fake_engine.handler = table.insert
+    return table
+
+
+async def test_duplicates_are_reported_per_vote(fake_engine, votes):
+    counted = []
+    ingestor = VoteIngestor(fake_engine, max_latency=0.01, on_counted=lambda *args: counted.append(args))
+    ingestor.start()
+    try:
+        results = await asyncio.gather(*(ingestor.submit("p1", "o1", user) for user in ("u1", "u2", "u1")))
+    finally:
+        await ingestor.stop()
+    assert sorted(results) == [False, True, True]
+    assert ingestor.duplicates == 1
+    # One absolute total per option and batch
+    assert counted == [("p1", "o1", 2)]
+
+
+async def test_bad_row_fails_alone(fake_engine, votes):
+    ingestor = VoteIngestor(fake_engine, max_latency=0.01)
+    ingestor.start()
+    try:
+        results = await asyncio.gather(*(
+            ingestor.submit("p1", "bad" if user == "u3" else "o1", user) for user in ("u0", "u1", "u2", "u3", "u4", "u5")
+        ), return_exceptions=True)
+    finally:
+        await ingestor.stop()
+    assert [isinstance(result, DBAPIError) for result in results] == [False, False, False, True, False, False]
+    assert [result for result in results if not isinstance(result, Exception)] == [True] * 5
+    assert len(votes.votes) == 5
+    assert ingestor.splits > 0
+
+
+@pytest.mark.parametrize("poll_id, option_id", [("p1", "o" * 129), ("p1", None), (["p1"], "o1"), ("", "o1")])
+async def test_invalid_ids_are_rejected_before_queueing(fake_engine, votes, poll_id, option_id):
+    ingestor = VoteIngestor(fake_engine)
+    with pytest.raises(InvalidVote):
+        await ingestor.submit(poll_id, option_id, "u1")
+    assert fake_engine.executed == []
+
+
+async def test_repeated_idempotency_key_gets_the_first_outcome(fake_engine, votes):
+    ingestor = VoteIngestor(fake_engine, max_latency=0.01, voted=VotedSet(fake_engine))
+    ingestor.start()
+    try:
+        first = await ingestor.submit("p1", "o1", "u1", idempotency_key="k1")
+        retried = await ingestor.submit("p1", "o1", "u1", idempotency_key="k1")
+        again = await ingestor.submit("p1", "o1", "u1", idempotency_key="k2")
+        # The same key on another poll is a different vote
+        other_poll = await ingestor.submit("p2", "o1", "u1", idempotency_key="k1")
+    finally:
+        await ingestor.stop()
+    assert (first, retried, again, other_poll) == (True, True, False, True)
+    assert ingestor.voted.replayed == 1
+    assert votes.votes == {("p1", "u1"), ("p2", "u1")}
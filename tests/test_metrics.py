@@ -0,0 +1,38 @@
+from project.metrics import Histogram, Meter, Registry
+
+
+def test_render_exposition_format():
+    registry = Registry(prefix="app_")
+    meter = Meter()
+    meter.mark(3)
+    registry.counter("consumed_total", meter, "Messages consumed")
+    registry.gauge("connections", lambda: 2)
+    registry.gauge("ratio", lambda: 0.5, "Share of C:\\pool\nchecked out")
+    assert registry.render().splitlines() == [
+        "# HELP app_consumed_total Messages consumed",
+        "# TYPE app_consumed_total counter",
+        "app_consumed_total 3",
+        # No HELP line without help text
+        "# TYPE app_connections gauge",
+        "app_connections 2",
+        # Backslashes and line breaks in HELP are escaped
+        "# HELP app_ratio Share of C:\\\\pool\\nchecked out",
+        "# TYPE app_ratio gauge",
+        "app_ratio 0.5",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    registry = Registry()
+    registry.histogram("latency_seconds", histogram)
+    assert registry.render().splitlines() == [
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
@@ -0,0 +1,42 @@
+import pytest
+from starlette.requests import Request
+
+from project.pages import WsClientPage
+
+pytestmark = pytest.mark.anyio
+
+
+def request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "headers": raw})
+
+
+@pytest.fixture
+def page(fake_engine):
+    # USERS then POLL_OPTIONS on every build
+    fake_engine.rows = [[("u1", "Alice")], [("p1", "Lunch?", "o1", "Pizza")]]
+    fake_engine.handler = lambda params: fake_engine.rows[(len(fake_engine.executed) - 1) % 2]
+    return WsClientPage(fake_engine)
+
+
+async def test_matching_etag_is_answered_with_304(page):
+    first = await page.response(request())
+    assert first.status_code == 200 and b"Alice" in first.body
+    etag = first.headers["etag"]
+    assert (await page.response(request(if_none_match=etag))).status_code == 304
+    assert (await page.response(request(if_none_match=f'"other", {etag}'))).status_code == 304
+    assert (await page.response(request(if_none_match='"other"'))).status_code == 200
+    not_modified = await page.response(request(if_modified_since=first.headers["last-modified"]))
+    assert not_modified.status_code == 304 and not_modified.body == b""
+    assert page.builds == 1
+
+
+async def test_invalidate_rebuilds_the_page_with_a_new_etag(fake_engine, page):
+    etag = (await page.response(request())).headers["etag"]
+    fake_engine.rows[0] = [("u1", "Alice"), ("u2", "Bob")]
+    # Served from memory until invalidated
+    assert (await page.response(request(if_none_match=etag))).status_code == 304
+    page.invalidate()
+    rebuilt = await page.response(request(if_none_match=etag))
+    assert rebuilt.status_code == 200 and b"Bob" in rebuilt.body
+    assert rebuilt.headers["etag"] != etag
@@ -0,0 +1,209 @@
+import asyncio
+
+import pytest
+
+from project.core import PikaClient
+from project.serializers import serializer
+from tests.broker import InMemoryBroker, Queue
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(condition, timeout: float = 1.0):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not condition():
+        if asyncio.get_event_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.001)
+
+
+async def declare(broker: InMemoryBroker, name: str):
+    connection = await broker.connect()
+    return await (await connection.channel()).declare_queue(name, durable=True)
+
+
+def drain(queue) -> list:
+    bodies = []
+    while queue.qsize():
+        bodies.append(serializer.loads(queue._messages.get_nowait()[0]))
+    return bodies
+
+
+async def test_connection_is_opened_once_and_reused():
+    broker = InMemoryBroker(latency=0.001)
+    client = PikaClient(None, connection_factory=broker.connect)
+    await asyncio.gather(*(client.init_connection() for _ in range(5)))
+    await client.publish_async({"n": 1}, "q")
+    await client.publish_batch([{"n": 2}], "q")
+    assert broker.connections_opened == 1
+    assert client.is_connected()
+    await client.close()
+
+
+async def test_publishes_share_a_bounded_channel_pool():
+    broker = InMemoryBroker(latency=0.001)
+    client = PikaClient(None, connection_factory=broker.connect, channel_pool_size=2)
+    await asyncio.gather(*(client.publish_batch([{"n": i}], "q") for i in range(10)))
+    assert len(client.connection._channels) == 2
+    await client.close()
+
+
+async def test_publish_batch_returns_the_confirmed_count():
+    broker = InMemoryBroker()
+    queue = await declare(broker, "q")
+    client = PikaClient(None, connection_factory=broker.connect)
+    assert await client.publish_batch([], "q") == 0
+    assert await client.publish_batch([{"n": 1}, b'{"n":2}', {"n": 3}], "q") == 3
+    assert drain(queue) == [{"n": 1}, {"n": 2}, {"n": 3}]
+    assert client.stats()["published"] == 3
+    await client.close()
+
+
+async def test_consume_acks_processed_messages():
+    broker = InMemoryBroker()
+    received = []
+    client = PikaClient(received.append, connection_factory=broker.connect, prefetch_count=1)
+    await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"n": 1}, {"n": 2}], "q")
+    # With a prefetch of one the second message is only delivered after the first is acked
+    await eventually(lambda: len(received) == 2)
+    assert received == [{"n": 1}, {"n": 2}]
+    assert client.consumed.count == 2
+    await client.close()
+
+
+async def test_batch_consumer_rejects_undecodable_and_requeues_failed_batches():
+    broker = InMemoryBroker()
+    batches = []
+
+    def handle(notifications):
+        batches.append([n.message for n in notifications])
+        if len(batches) == 1:
+            raise RuntimeError("delivery failed")
+
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=handle, prefetch_count=10,
+                        consumer_workers=1)
+    await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([b"not json", {"recipients": ["u1"], "message": "hi"}], "q")
+    await eventually(lambda: client.consumed.count == 1)
+    assert client.rejected == 1
+    # The failed batch was nacked with requeue and delivered again
+    assert batches == [["hi"], ["hi"]]
+    assert broker.queues["q"].qsize() == 0
+    await client.close()
+
+
+async def test_poison_message_is_rejected_after_its_redelivery():
+    broker = InMemoryBroker()
+    attempts = []
+
+    def handle(notifications):
+        attempts.append([n.message for n in notifications])
+        raise RuntimeError("delivery failed")
+
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=handle, prefetch_count=10,
+                        consumer_workers=1)
+    await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"message": "poison"}], "q")
+    await eventually(lambda: client.rejected == 1)
+    assert attempts == [["poison"], ["poison"]]
+    await asyncio.sleep(0.01)
+    assert broker.queues["q"].qsize() == 0 and len(attempts) == 2
+    await client.close()
+
+
+async def test_workers_survive_a_channel_closed_before_the_ack():
+    broker = InMemoryBroker()
+    handled = []
+    release = asyncio.Event()
+
+    async def handle(notifications):
+        handled.extend(n.message for n in notifications)
+        await release.wait()
+
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=handle, prefetch_count=10,
+                        consumer_workers=1)
+    await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"message": 1}], "q")
+    await eventually(lambda: handled == [1])
+    # The connection drops while the batch is being handled, so its ack fails
+    channel = client._consumer_connection._channels[0]
+    await channel.close()
+    release.set()
+    await asyncio.sleep(0.01)
+    assert not any(task.done() for task in client._worker_tasks)
+
+    # After the reconnect the unacked message comes back and is consumed normally
+    reconnected = await client._consumer_connection.channel()
+    await broker.queues["q"].consume(client._receive, channel=reconnected)
+    await eventually(lambda: client.consumed.count == 1)
+    assert handled == [1, 1]
+    await client.close()
+
+
+async def test_failed_consume_closes_its_connection_and_workers(monkeypatch):
+    broker = InMemoryBroker()
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=lambda notifications: None,
+                        prefetch_count=5)
+    consume = Queue.consume
+
+    async def unavailable(*args, **kwargs):
+        raise ConnectionError("channel closed")
+
+    monkeypatch.setattr(Queue, "consume", unavailable)
+    with pytest.raises(ConnectionError):
+        await client.consume(asyncio.get_event_loop(), "q")
+    await asyncio.sleep(0)
+    assert client._consumer_connection is None and client._worker_tasks == []
+
+    # The retry starts from scratch
+    monkeypatch.setattr(Queue, "consume", consume)
+    connection = await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"message": 1}], "q")
+    await eventually(lambda: client.consumed.count == 1)
+    assert client._consumer_connection is connection
+    await client.close()
+
+
+async def test_batch_consumer_requires_a_prefetch_count():
+    with pytest.raises(ValueError):
+        PikaClient(None, batch_callable=lambda notifications: None)
+
+
+async def test_inbox_is_bounded_by_the_prefetch_count():
+    broker = InMemoryBroker()
+    release = asyncio.Event()
+
+    async def handle(notifications):
+        await release.wait()
+
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=handle, prefetch_count=3,
+                        consumer_workers=1, consume_batch_size=1)
+    await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"message": i} for i in range(10)], "q")
+    await eventually(lambda: broker.queues["q"].qsize() == 7)
+    await asyncio.sleep(0.01)
+    assert broker.queues["q"].qsize() == 7
+    assert client._inbox.qsize() <= 3
+    release.set()
+    await eventually(lambda: client.consumed.count == 10)
+    await client.close()
+
+
+async def test_close_releases_connections_and_workers():
+    broker = InMemoryBroker()
+    client = PikaClient(None, connection_factory=broker.connect, batch_callable=lambda notifications: None,
+                        prefetch_count=5)
+    consumer = await client.consume(asyncio.get_event_loop(), "q")
+    await client.publish_batch([{"message": 1}], "q")
+    connection = client.connection
+    workers = list(client._worker_tasks)
+    await client.close()
+    await asyncio.sleep(0)
+    assert connection.is_closed and consumer.is_closed
+    assert not client.is_connected()
+    assert all(task.done() for task in workers)
+    # A later publish opens a new connection
+    await client.publish_batch([{"message": 2}], "q")
+    assert broker.connections_opened == 3
+    await client.close()
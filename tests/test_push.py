@@ -0,0 +1,94 @@
+import pytest
+
+from project.polls.push import TallyPushScheduler
+from project.polls.tally import PollTally
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeTallyCache:
+    def __init__(self):
+        self.tallies = {}
+
+    def set(self, poll_id: str, **totals):
+        tally = self.tallies.setdefault(poll_id, PollTally(poll_id, "question"))
+        for option_id, total in totals.items():
+            tally.add_option(option_id, option_id.upper(), total)
+
+    async def get(self, poll_id: str):
+        return self.tallies.get(poll_id)
+
+
+class Publisher:
+    def __init__(self):
+        self.frames = []
+        self.fail = False
+
+    async def __call__(self, notifications, frames):
+        if self.fail:
+            raise ConnectionError("broker unavailable")
+        self.frames.extend(frames)
+
+
+async def test_snapshot_then_deltas():
+    cache, publish = FakeTallyCache(), Publisher()
+    push = TallyPushScheduler(cache, publish)
+    cache.set("p1", a=0, b=0)
+    push.mark_dirty("p1")
+    assert await push.tick() == 1
+    cache.set("p1", a=1)
+    push.mark_dirty("p1")
+    await push.tick()
+    push.mark_dirty("p1")
+    assert await push.tick() == 0
+    assert [(f["type"], f["seq"]) for f in publish.frames] == [("tally", 1), ("tally_delta", 2)]
+    assert publish.frames[1]["totals"] == {"a": 1}
+
+
+async def test_failed_publish_is_retried_without_advancing():
+    cache, publish = FakeTallyCache(), Publisher()
+    push = TallyPushScheduler(cache, publish)
+    cache.set("p1", a=0)
+    push.mark_dirty("p1")
+    await push.tick()
+
+    cache.set("p1", a=1)
+    push.mark_dirty("p1")
+    publish.fail = True
+    with pytest.raises(ConnectionError):
+        await push.tick()
+    assert (await push.snapshot("p1"))["seq"] == 1
+
+    publish.fail = False
+    assert await push.tick() == 1
+    assert [(f["type"], f["seq"], f["totals"]) for f in publish.frames] == [("tally", 1, {"a": 0}),
+                                                                            ("tally_delta", 2, {"a": 1})]
+
+
+async def test_refresh_reads_totals_at_push_time():
+    cache, publish = FakeTallyCache(), Publisher()
+    reconciled = []
+
+    async def reconcile(poll_ids, notify=True):
+        reconciled.append((set(poll_ids), notify))
+        # Votes committed by another worker
+        cache.set("p1", a=5)
+
+    cache.reconcile = reconcile
+    push = TallyPushScheduler(cache, publish, refresh=True)
+    cache.set("p1", a=1)
+    push.mark_dirty("p1")
+    await push.tick()
+    assert reconciled == [({"p1"}, False)]
+    assert publish.frames[0]["totals"] == {"a": 5}
+
+
+async def test_stop_logs_a_failed_final_push(caplog):
+    cache, publish = FakeTallyCache(), Publisher()
+    push = TallyPushScheduler(cache, publish)
+    cache.set("p1", a=1)
+    push.mark_dirty("p1")
+    publish.fail = True
+    await push.stop()
+    assert "Final tally push failed" in caplog.text
+    assert push.stats()["dirty"] == 1
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from project.readiness import Readiness
+
+pytestmark = pytest.mark.anyio
+
+
+class Step:
+    """A startup step failing its first ``failures`` attempts."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+
+    async def __call__(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("not up yet")
+
+
+async def test_ready_once_required_steps_succeed():
+    readiness = Readiness(max_backoff=0.001)
+    readiness.start()
+    database, caches = Step(failures=2), Step(failures=1000)
+    readiness.run("database", database)
+    readiness.run("caches", caches, required=False)
+    assert not readiness.ready
+    await readiness.wait(timeout=1)
+    assert readiness.ready and database.attempts == 3
+    report = readiness.report()
+    assert report["steps"]["database"] is not None and report["steps"]["caches"] is None
+    assert report["ready_after"] is not None
+    # The error of a step is only reported until it succeeds
+    assert "database" not in report["errors"] and "ConnectionError" in report["errors"]["caches"]
+    await readiness.cancel()
+
+
+async def test_timings_start_with_start():
+    readiness = Readiness()
+    await asyncio.sleep(0.05)
+    readiness.start()
+    readiness.request_started()
+    readiness.request_started()
+    assert readiness.first_request_after < 0.05
+
+
+async def test_cancel_stops_retrying_steps():
+    readiness = Readiness(max_backoff=0.001)
+    broker = Step(failures=1000)
+    task = readiness.run("broker", broker)
+    await asyncio.sleep(0.01)
+    await readiness.cancel()
+    assert task.cancelled()
+    attempts = broker.attempts
+    await asyncio.sleep(0.01)
+    assert broker.attempts == attempts and not readiness.ready
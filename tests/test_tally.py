@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from project.polls.tally import TallyCache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def counts(fake_engine):
+    """poll_option_counts as a dict, answering the TALLY query."""
+    totals = {}
+    fake_engine.handler = lambda params: [(poll_id, "question", option_id, option_id.upper(), total)
+                                          for (poll_id, option_id), total in sorted(totals.items())
+                                          if poll_id in params["poll_ids"]]
+    return totals
+
+
+async def test_total_set_during_load_is_kept(fake_engine, counts):
+    counts.update({("p1", "a"): 0, ("p1", "b"): 0})
+    cache = TallyCache(fake_engine)
+    fake_engine.gate.clear()
+    load = asyncio.ensure_future(cache.get("p1"))
+    await asyncio.sleep(0)
+    # Committed after the load's snapshot, reported while the query is still running
+    counts["p1", "a"] = 1
+    cache.set_total("p1", "a", 1)
+    fake_engine.gate.set()
+    tally = await load
+    assert tally.totals == {"a": 1, "b": 0}
+
+
+async def test_reconcile_keeps_totals_set_while_it_runs(fake_engine, counts):
+    counts.update({("p1", "a"): 0})
+    cache = TallyCache(fake_engine)
+    await cache.get("p1")
+    fake_engine.gate.clear()
+    reconcile = asyncio.ensure_future(cache.reconcile())
+    await asyncio.sleep(0)
+    cache.set_total("p1", "a", 1)
+    fake_engine.gate.set()
+    await reconcile
+    assert (await cache.get("p1")).totals == {"a": 1}
+
+
+async def test_reconcile_reports_changed_polls(fake_engine, counts):
+    counts.update({("p1", "a"): 0, ("p2", "a"): 0})
+    cache = TallyCache(fake_engine)
+    changed = []
+    cache.on_changed = changed.append
+    await cache.get("p1")
+    await cache.get("p2")
+    counts["p2", "a"] = 3
+    await cache.reconcile()
+    assert changed == ["p2"]
+    assert (await cache.get("p2")).totals == {"a": 3}
+
+
+async def test_totals_never_go_backwards(fake_engine, counts):
+    counts.update({("p1", "a"): 5})
+    cache = TallyCache(fake_engine)
+    await cache.get("p1")
+    cache.set_total("p1", "a", 4)
+    cache.set_total("p1", "a", 7)
+    assert (await cache.get("p1")).totals == {"a": 7}
+
+
+async def test_reconcile_subset_without_notifying(fake_engine, counts):
+    counts.update({("p1", "a"): 0, ("p2", "a"): 0})
+    cache = TallyCache(fake_engine)
+    changed = []
+    cache.on_changed = changed.append
+    await cache.get("p1")
+    await cache.get("p2")
+    counts["p1", "a"] = counts["p2", "a"] = 2
+    await cache.reconcile(["p1", "p3"], notify=False)
+    assert changed == []
+    assert (await cache.get("p1")).totals == {"a": 2}
+    assert (await cache.get("p2")).totals == {"a": 0}
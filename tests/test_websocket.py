@@ -0,0 +1,110 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from project.core import BinaryFrame, OverflowPolicy, TextFrame, WebSocketManager, compress_frame
+from tests.fakes import FakeWebSocket
+
+
+@pytest.mark.parametrize("payload, frame", [
+    ("Hello", '"Hello"'),
+    ({"type": "vote", "poll_id": "p1"}, '{"type":"vote","poll_id":"p1"}'),
+    (TextFrame('{"already":"encoded"}'), '{"already":"encoded"}'),
+    (b'{"raw":1}', '{"raw":1}'),
+])
+def test_encode(payload, frame):
+    assert json.loads(WebSocketManager.encode(payload)) == json.loads(frame)
+
+
+def test_encode_keeps_binary_frames():
+    frame = compress_frame('{"a":1}')
+    assert WebSocketManager.encode(frame) is frame
+    assert isinstance(frame, BinaryFrame) and zlib.decompress(frame) == b'{"a":1}'
+
+
+@pytest.mark.anyio
+async def test_messages_to_an_evicted_user_are_dropped():
+    manager = WebSocketManager()
+    manager.add_user("u1", "User 1", FakeWebSocket(fail=True))
+    assert await manager.broadcast_by_user_id("u1", {"type": "vote"}) is True
+    await manager.flush()
+    assert manager.evicted == 1
+    assert await manager.broadcast_by_user_id("u1", {"type": "error"}) is False
+
+
+@pytest.mark.anyio
+async def test_drop_oldest_keeps_the_newest_frames():
+    manager = WebSocketManager(queue_size=2, overflow_policy=OverflowPolicy.DROP_OLDEST)
+    websocket = FakeWebSocket()
+    manager.add_user("u1", "User 1", websocket)
+    for n in range(4):
+        assert manager.send_to_user("u1", {"n": n})
+    await manager.flush()
+    assert [json.loads(frame) for frame in websocket.sent] == [{"n": 2}, {"n": 3}]
+    assert manager.dropped == 2
+
+
+@pytest.mark.anyio
+async def test_coalesce_replaces_queued_tallies_of_the_same_poll():
+    manager = WebSocketManager(queue_size=2, overflow_policy=OverflowPolicy.COALESCE)
+    websocket = FakeWebSocket()
+    manager.add_user("u1", "User 1", websocket)
+    for votes in range(3):
+        manager.send_to_user("u1", {"poll_id": "p1", "votes": votes})
+    manager.send_to_user("u1", {"poll_id": "p2", "votes": 0})
+    await manager.flush()
+    assert [json.loads(frame) for frame in websocket.sent] == [
+        {"poll_id": "p1", "votes": 2}, {"poll_id": "p2", "votes": 0}]
+    assert manager.coalesced == 2
+    assert manager.dropped == 0
+
+
+@pytest.mark.anyio
+async def test_disconnect_evicts_a_connection_with_a_full_queue():
+    manager = WebSocketManager(queue_size=2, overflow_policy=OverflowPolicy.DISCONNECT)
+    websocket = FakeWebSocket(stall=True)
+    manager.add_user("u1", "User 1", websocket)
+    assert manager.send_to_user("u1", {"n": 0})
+    assert manager.send_to_user("u1", {"n": 1})
+    assert not manager.send_to_user("u1", {"n": 2})
+    # The socket is closed in the background
+    await asyncio.sleep(0.01)
+    assert manager.evicted == 1
+    assert manager.get_user("u1") is None
+    assert websocket.closed
+
+
+@pytest.mark.anyio
+async def test_topic_messages_reach_only_the_subscribed_socket():
+    manager = WebSocketManager()
+    delta_tab, legacy_tab = FakeWebSocket(), FakeWebSocket()
+    delta = manager.add_user("u1", "User 1", delta_tab)
+    legacy = manager.add_user("u1", "User 1", legacy_tab)
+    manager.subscribe("poll:p1:delta", delta)
+    manager.subscribe("poll:p1", legacy)
+    assert manager.deliver({"type": "tally_delta"}, topic="poll:p1:delta") == 1
+    # A direct recipient gets it on every socket, but each socket only once
+    assert manager.deliver({"type": "vote"}, recipients=["u1"], topic="poll:p1") == 2
+    await manager.flush()
+    assert [json.loads(frame)["type"] for frame in delta_tab.sent] == ["tally_delta", "vote"]
+    assert [json.loads(frame)["type"] for frame in legacy_tab.sent] == ["vote"]
+
+
+def test_one_socket_leaving_keeps_the_other_subscribed():
+    manager = WebSocketManager()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    a = manager.add_user("u1", "User 1", first)
+    b = manager.add_user("u1", "User 1", second)
+    manager.subscribe("poll:p1", a)
+    manager.subscribe("poll:p1", b)
+    manager.unsubscribe("poll:p1", a)
+    assert manager.subscribers("poll:p1") == {b}
+    manager.subscribe("poll:p2", a)
+    manager.subscribe("poll:p2", b)
+    manager.remove_user("u1", second)
+    assert manager.subscribers("poll:p2") == {a}
+    assert "poll:p1" not in manager.topics
+    # A removed socket cannot subscribe again
+    assert manager.subscribe("poll:p1", b) is False